@@ -9,19 +9,38 @@ import os
 import json
 import sqlite3
 import hashlib
+import gzip
+import zlib
+import csv
+import io
 import secrets
 import threading
+import queue
+import signal
+import _thread
 import schedule
 import time
+import socket
+import uuid
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, request, jsonify, render_template_string
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import jwt
 import logging
-from checkin_token import LeafLowTokenCheckin
+from checkin_token import LeafLowTokenCheckin, MAIN_SITE, CHECKIN_URL
+import http_transport
+import metrics
+import log_setup
 import random
 
+try:
+    import brotli  # optional: serve brotli-compressed assets when installed
+except ImportError:
+    brotli = None
+
 # Configuration
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32))
@@ -37,18 +56,51 @@ DB_NAME = os.getenv('DB_NAME', 'leaflow_checkin')
 DB_USER = os.getenv('DB_USER', 'root')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 PORT = int(os.getenv('PORT', '8181'))
+LEASE_TTL = int(os.getenv('LEASE_TTL', '15'))  # seconds before a dead leader is replaced
+LEASE_HEARTBEAT = int(os.getenv('LEASE_HEARTBEAT', '5'))
+APP_ROLE = os.getenv('APP_ROLE', 'all')  # all (panel + scheduler + workers) or worker
+CHECKIN_WORKERS = int(os.getenv('CHECKIN_WORKERS', '1'))  # worker threads per process
+JOB_LEASE_TTL = int(os.getenv('JOB_LEASE_TTL', '900'))  # seconds before a claimed job is reclaimed
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '2'))
+CHECKIN_DELAY_MIN = int(os.getenv('CHECKIN_DELAY_MIN', '30'))  # random delay before each check-in (seconds)
+CHECKIN_DELAY_MAX = int(os.getenv('CHECKIN_DELAY_MAX', '60'))
+SERVER_MODE = os.getenv('SERVER_MODE', 'development')  # development (Flask) or production (waitress)
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '8'))
+SERVER_CHANNEL_TIMEOUT = int(os.getenv('SERVER_CHANNEL_TIMEOUT', '120'))  # idle keep-alive / slow request timeout
+SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', '100'))
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', '120'))  # seconds to drain requests and check-in jobs
+PREWARM_LEAD = int(os.getenv('PREWARM_LEAD', '60'))  # seconds before a slot to warm up; 0 disables
+PREWARM_VALIDATE = os.getenv('PREWARM_VALIDATE', '0') == '1'  # also probe the slot's tokens ahead of time
+CATCHUP_ENABLED = os.getenv('CATCHUP_ENABLED', '1') == '1'  # run missed slots from earlier today after a restart
+CATCHUP_CONCURRENCY = int(os.getenv('CATCHUP_CONCURRENCY', str(CHECKIN_WORKERS)))  # catch-up jobs queued at once
+CHECKIN_TIMEOUT = int(os.getenv('CHECKIN_TIMEOUT', '30'))  # read timeout per LeafLow request (seconds)
+CHECKIN_CONNECT_TIMEOUT = int(os.getenv('CHECKIN_CONNECT_TIMEOUT', '10'))  # connect timeout per LeafLow request (seconds)
+CHECKIN_DEADLINE = int(os.getenv('CHECKIN_DEADLINE', '120'))  # total budget for one account's auth probes and check-in attempts, 0 = none
+SCHEDULE_SPREAD = os.getenv('SCHEDULE_SPREAD', '0') == '1'  # spread accounts without a check-in time over SCHEDULE_SPREAD_WINDOW
+SCHEDULE_SPREAD_DEFAULT = os.getenv('SCHEDULE_SPREAD_DEFAULT', '0') == '1'  # also spread accounts stored at the old default 01:00
+SCHEDULE_SPREAD_WINDOW = os.getenv('SCHEDULE_SPREAD_WINDOW', '01:00-05:00')  # HH:MM-HH:MM, may wrap past midnight
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))  # seconds cached account rows / notification settings stay valid; 0 disables
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', '5'))  # batch history writes for this long; 0 commits each write
+GROUP_COMMIT_MAX_ROWS = int(os.getenv('GROUP_COMMIT_MAX_ROWS', '100'))  # commit early once this many writes are queued
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))  # history rows read per query when exporting
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # optional bearer token for /metrics
 
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('control_panel.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Logging setup (queued, rotating; see log_setup.py)
+log_setup.setup_logging('control_panel.log')
 logger = logging.getLogger(__name__)
 
+HISTORY_METRIC_COLUMNS = [
+    ('duration_ms', 'INTEGER'),
+    ('session_ms', 'INTEGER'),
+    ('auth_ms', 'INTEGER'),
+    ('checkin_ms', 'INTEGER'),
+    ('notify_ms', 'INTEGER'),
+    ('http_requests', 'INTEGER'),
+    ('bytes_downloaded', 'INTEGER'),
+    ('endpoint', 'VARCHAR(255)'),
+]
+
 class Database:
     def __init__(self):
         if DB_TYPE == 'mysql':
@@ -64,6 +116,7 @@ class Database:
         else:
             self.conn = sqlite3.connect('leaflow_checkin.db', check_same_thread=False)
             self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
         self.init_tables()
     
     def init_tables(self):
@@ -76,7 +129,7 @@ class Database:
                 name VARCHAR(255) UNIQUE NOT NULL,
                 token_data TEXT NOT NULL,
                 enabled BOOLEAN DEFAULT 1,
-                checkin_time VARCHAR(5) DEFAULT '01:00',
+                checkin_time VARCHAR(5),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
@@ -95,6 +148,11 @@ class Database:
             )
         ''')
         
+        # Per-run timing and request accounting (added after the original schema)
+        for column, ddl in HISTORY_METRIC_COLUMNS:
+            self._add_column(cursor, 'checkin_history', column, ddl)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_history_account_date ON checkin_history (account_id, checkin_date, success)')
+        
         # Notification settings table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notification_settings (
@@ -107,6 +165,40 @@ class Database:
             )
         ''')
         
+        # Check-in job queue
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS checkin_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL,
+                status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                claim VARCHAR(255),
+                lease_expires DOUBLE DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                enqueued_at DOUBLE DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (account_id) REFERENCES accounts(id)
+            )
+        ''')
+        self._add_column(cursor, 'checkin_jobs', 'batch_id', 'VARCHAR(32)')
+        self._add_column(cursor, 'checkin_jobs', 'force_run', 'INTEGER DEFAULT 0')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_jobs_status ON checkin_jobs (status, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkin_jobs_batch ON checkin_jobs (batch_id)')
+        
+        # Scheduler lease table (one row per lease)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_lock (
+                name VARCHAR(64) PRIMARY KEY,
+                owner VARCHAR(255),
+                expires_at DOUBLE DEFAULT 0,
+                version INTEGER DEFAULT 0
+            )
+        ''')
+        
+        self._run(cursor, 'SELECT COUNT(*) as count FROM scheduler_lock WHERE name = ?', ('scheduler',))
+        if cursor.fetchone()[0] == 0:
+            self._run(cursor, 'INSERT INTO scheduler_lock (name, owner, expires_at) VALUES (?, ?, ?)', ('scheduler', '', 0))
+        
         # Initialize notification settings if not exists
         cursor.execute('SELECT COUNT(*) as count FROM notification_settings')
         if cursor.fetchone()[0] == 0:
@@ -117,25 +209,117 @@ class Database:
         
         self.conn.commit()
     
+    def _add_column(self, cursor, table, column, ddl):
+        cursor.execute(f'SELECT * FROM {table} LIMIT 0')
+        if column not in [description[0] for description in cursor.description]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+    
     def execute(self, query, params=None):
-        cursor = self.conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        self.conn.commit()
+        with self.lock:
+            cursor = self.conn.cursor()
+            self._run(cursor, query, params)
+            self.conn.commit()
+            return cursor
+    
+    def _run(self, cursor, query, params=None):
+        if DB_TYPE == 'mysql':
+            query = query.replace('?', '%s')
+        with metrics.db_query_seconds.time(operation=query.split(None, 1)[0].upper()):
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
         return cursor
     
+    @contextmanager
+    def transaction(self):
+        """Run several statements in one transaction; yields an execute(query, params) function"""
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                yield lambda query, params=None: self._run(cursor, query, params)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+    
     def fetchone(self, query, params=None):
-        cursor = self.execute(query, params)
-        return cursor.fetchone()
+        with self.lock:
+            cursor = self.execute(query, params)
+            return cursor.fetchone()
     
     def fetchall(self, query, params=None):
-        cursor = self.execute(query, params)
-        return cursor.fetchall()
+        with self.lock:
+            cursor = self.execute(query, params)
+            return cursor.fetchall()
 
 db = Database()
 
+# Writer thread that commits the small per-check-in writes (history rows,
+# job completion, rotated cookies) in groups: one transaction and one
+# fsync per GROUP_COMMIT_WINDOW_MS or GROUP_COMMIT_MAX_ROWS writes.
+class GroupCommitWriter:
+    def __init__(self, window=GROUP_COMMIT_WINDOW_MS / 1000, max_rows=GROUP_COMMIT_MAX_ROWS):
+        self.window = window
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def submit(self, write):
+        """Queue write(execute); the future resolves to its return value once committed"""
+        future = Future()
+        if self.window <= 0:
+            self._commit([(write, future)])
+            return future
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run_writer, name='group-commit', daemon=True)
+                self.thread.start()
+        self.queue.put((write, future))
+        return future
+    
+    def run(self, write):
+        """Submit and wait until the write is committed (must not be called inside db.transaction)"""
+        return self.submit(write).result()
+    
+    def flush(self, timeout=None):
+        """Wait for everything queued so far to be committed"""
+        if self.thread is not None:
+            self.submit(lambda execute: None).result(timeout)
+    
+    def _run_writer(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+    
+    def _commit(self, batch):
+        try:
+            with db.transaction() as execute:
+                results = [write(execute) for write, _ in batch]
+        except Exception as e:
+            if len(batch) > 1:
+                # Don't let one bad write fail the group: retry each on its own
+                for item in batch:
+                    self._commit([item])
+            else:
+                batch[0][1].set_exception(e)
+            return
+        metrics.group_commit_size.observe(len(batch))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+history_writer = GroupCommitWriter()
+
 # JWT authentication decorator
 def token_required(f):
     @wraps(f)
@@ -158,92 +342,683 @@ def token_required(f):
     
     return decorated
 
+# Database-backed lease so only one process runs scheduled jobs
+class LeaderLease:
+    def __init__(self, name='scheduler', alive=None):
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Renew only while alive() says the thread doing the leader's work is running
+        self.alive = alive
+        self.is_leader = threading.Event()
+        self.heartbeat_thread = None
+        self.running = False
+    
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True)
+            self.heartbeat_thread.start()
+    
+    def stop(self):
+        self.running = False
+        if self.heartbeat_thread:
+            self.heartbeat_thread.join(timeout=LEASE_HEARTBEAT + 1)
+        self.release()
+    
+    def acquire(self):
+        """Take or renew the lease; returns True if this process holds it"""
+        now = time.time()
+        cursor = db.execute('''
+            UPDATE scheduler_lock SET owner = ?, expires_at = ?
+            WHERE name = ? AND (owner = ? OR expires_at < ?)
+        ''', (self.owner, now + LEASE_TTL, self.name, self.owner, now))
+        return cursor.rowcount == 1
+    
+    def release(self):
+        if self.is_leader.is_set():
+            db.execute('UPDATE scheduler_lock SET expires_at = 0 WHERE name = ? AND owner = ?', (self.name, self.owner))
+            self.is_leader.clear()
+            logger.info(f"Released scheduler lease ({self.owner})")
+    
+    def _heartbeat(self):
+        while self.running:
+            if self.alive is not None and not self.alive():
+                # Let the lease expire so another process takes over
+                if self.is_leader.is_set():
+                    logger.error(f"Scheduler thread is not running, no longer renewing lease ({self.owner})")
+                held = False
+            else:
+                try:
+                    held = self.acquire()
+                except Exception as e:
+                    logger.error(f"Lease heartbeat error: {str(e)}")
+                    held = False
+            
+            if held and not self.is_leader.is_set():
+                logger.info(f"Acquired scheduler lease ({self.owner})")
+                self.is_leader.set()
+            elif not held and self.is_leader.is_set():
+                logger.warning(f"Lost scheduler lease ({self.owner})")
+                self.is_leader.clear()
+            time.sleep(LEASE_HEARTBEAT)
+
+def insert_history(execute, account_id, success, message, stats=None):
+    """Insert a check-in history row with its run metrics; returns the row id"""
+    stats = stats or {}
+    columns = [column for column, _ in HISTORY_METRIC_COLUMNS]
+    cursor = execute(f'''
+        INSERT INTO checkin_history (account_id, success, message, checkin_date, {', '.join(columns)})
+        VALUES (?, ?, ?, ?, {', '.join('?' for _ in columns)})
+    ''', (account_id, success, message, datetime.now().date()) + tuple(stats.get(column) for column in columns))
+    return cursor.lastrowid
+
+def checked_in_today(account_id):
+    """Whether the account already has a successful check-in today"""
+    return db.fetchone('''
+        SELECT 1 FROM checkin_history
+        WHERE account_id = ? AND checkin_date = ? AND success = 1 LIMIT 1
+    ''', (account_id, datetime.now().date())) is not None
+
+def finish_history(history_id, notify_ms, duration_ms):
+    """Fill in the timings only known after the notification went out (not waited for)"""
+    history_writer.submit(lambda execute: execute(
+        'UPDATE checkin_history SET notify_ms = ?, duration_ms = ? WHERE id = ?', (notify_ms, duration_ms, history_id)))
+
+# Read-through cache for rows read on every check-in. The write routes
+# invalidate it locally and bump the scheduler_lock version, which every
+# process checks (at most once per LEASE_HEARTBEAT) before serving from cache.
+class CacheVersion:
+    def __init__(self, interval=LEASE_HEARTBEAT):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0
+    
+    def bump(self):
+        """Tell every process that accounts or settings changed"""
+        db.execute('UPDATE scheduler_lock SET version = version + 1 WHERE name = ?', ('scheduler',))
+    
+    def sync(self):
+        """Drop all cached rows if another process bumped the version since the last check"""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked_at < self.interval:
+                return
+            self.checked_at = now
+            row = db.fetchone('SELECT version FROM scheduler_lock WHERE name = ?', ('scheduler',))
+            version = row[0] if row else 0
+            changed = self.version is not None and version != self.version
+            self.version = version
+        if changed:
+            notification_settings_cache.invalidate()
+            invalidate_account()
+
+cache_version = CacheVersion()
+
+class RowCache:
+    def __init__(self, loader, ttl=CACHE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.rows = {}
+    
+    def get(self, key):
+        if self.ttl > 0:
+            cache_version.sync()
+        now = time.monotonic()
+        with self.lock:
+            entry = self.rows.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+        row = self.loader(key)
+        if row is not None and self.ttl > 0:
+            with self.lock:
+                self.rows[key] = (row, now + self.ttl)
+        return row
+    
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.rows.clear()
+            else:
+                self.rows.pop(key, None)
+
+account_cache = RowCache(lambda account_id: db.fetchone('SELECT * FROM accounts WHERE id = ?', (account_id,)))
+notification_settings_cache = RowCache(lambda _: db.fetchone('SELECT * FROM notification_settings WHERE id = 1'))
+
+def invalidate_account(account_id=None):
+    """Drop cached and pre-warmed copies of an account row (all rows if account_id is None)"""
+    account_cache.invalidate(account_id)
+    workers.prewarmer.forget(account_id)
+
+# Database-backed queue of check-in jobs, claimed with leases
+class CheckinQueue:
+    def enqueue(self, account_id):
+        """Queue a check-in unless one is already waiting for this account"""
+        with db.transaction() as execute:
+            active = execute('''
+                SELECT COUNT(*) FROM checkin_jobs
+                WHERE account_id = ? AND status IN ('pending', 'running')
+            ''', (account_id,)).fetchone()[0]
+            if active:
+                return False
+            execute('INSERT INTO checkin_jobs (account_id, enqueued_at) VALUES (?, ?)', (account_id, time.time()))
+        return True
+    
+    def enqueue_many(self, account_ids, batch_id, force=False):
+        """Queue check-ins for several accounts in one transaction; returns the ids actually queued"""
+        now = time.time()
+        with db.transaction() as execute:
+            active = {row[0] for row in execute(
+                "SELECT account_id FROM checkin_jobs WHERE status IN ('pending', 'running')").fetchall()}
+            queued = [account_id for account_id in account_ids if account_id not in active]
+            for account_id in queued:
+                execute('INSERT INTO checkin_jobs (account_id, enqueued_at, batch_id, force_run) VALUES (?, ?, ?, ?)',
+                        (account_id, now, batch_id, int(force)))
+        return queued
+    
+    def claim(self, owner):
+        """Lease the oldest pending job; returns (job_id, account_id, claim, force) or None"""
+        claim = f"{owner}:{uuid.uuid4().hex[:8]}"
+        with db.transaction() as execute:
+            # A single UPDATE is atomic under SQLite's write lock, so processes
+            # sharing the database file never claim the same job
+            cursor = execute('''
+                UPDATE checkin_jobs
+                SET status = 'running', claim = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = (SELECT id FROM checkin_jobs WHERE status = 'pending' ORDER BY id LIMIT 1)
+                  AND status = 'pending'
+            ''', (claim, time.time() + JOB_LEASE_TTL))
+            if cursor.rowcount != 1:
+                return None
+            row = execute('SELECT id, account_id, enqueued_at, force_run FROM checkin_jobs WHERE claim = ?', (claim,)).fetchone()
+            metrics.job_wait_seconds.observe(time.time() - row[2])
+        return row[0], row[1], claim, bool(row[3])
+    
+    def complete(self, job_id, claim, account_id, success, message, stats=None):
+        """Finish a job and record its history once; returns the history id, or None if the lease was lost"""
+        def write(execute):
+            cursor = execute('''
+                UPDATE checkin_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND claim = ? AND status = 'running'
+            ''', (job_id, claim))
+            if cursor.rowcount != 1:
+                return None
+            return insert_history(execute, account_id, success, message, stats)
+        return history_writer.run(write)
+    
+    def skip(self, job_id, claim):
+        """Finish a job without running it or recording history"""
+        db.execute('''
+            UPDATE checkin_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND claim = ? AND status = 'running'
+        ''', (job_id, claim))
+    
+    def reap(self):
+        """Requeue jobs whose lease expired and give up on those out of attempts"""
+        now = time.time()
+        with db.transaction() as execute:
+            requeued = execute('''
+                UPDATE checkin_jobs SET status = 'pending', claim = NULL
+                WHERE status = 'running' AND lease_expires < ? AND attempts < ?
+            ''', (now, JOB_MAX_ATTEMPTS)).rowcount
+            
+            expired = execute('''
+                SELECT id, account_id FROM checkin_jobs
+                WHERE status = 'running' AND lease_expires < ?
+            ''', (now,)).fetchall()
+            for job_id, account_id in expired:
+                execute('''
+                    UPDATE checkin_jobs SET status = 'failed', finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (job_id,))
+                insert_history(execute, account_id, False, f'Check-in job abandoned after {JOB_MAX_ATTEMPTS} attempts')
+            
+            # Finished jobs are only kept for a day; history is the permanent record
+            execute('''
+                DELETE FROM checkin_jobs
+                WHERE status IN ('done', 'failed') AND finished_at < ?
+            ''', (datetime.utcnow() - timedelta(days=1),))
+        
+        if requeued or expired:
+            logger.warning(f"Reclaimed {requeued} expired check-in jobs, abandoned {len(expired)}")
+
+job_queue = CheckinQueue()
+
+def _job_queue_depth():
+    rows = db.fetchall('SELECT status, COUNT(*) FROM checkin_jobs GROUP BY status')
+    return {(row[0],): row[1] for row in rows}
+
+metrics.job_queue_depth.set_function(_job_queue_depth)
+
+def checkin_config(account_data):
+    """Settings for a single-account LeafLowTokenCheckin run"""
+    return {
+        'settings': {
+            'log_level': 'INFO',
+            'retry_delay': 3,
+            'timeout': CHECKIN_TIMEOUT,
+            'connect_timeout': CHECKIN_CONNECT_TIMEOUT,
+            'account_deadline': CHECKIN_DEADLINE,
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        },
+        'accounts': [account_data]
+    }
+
+DEFAULT_CHECKIN_TIME = '01:00'
+
+def account_slot(account):
+    """The account's configured daily check-in time (HH:MM), the default when unset"""
+    return account['checkin_time'] or DEFAULT_CHECKIN_TIME
+
+def _seconds(checkin_time):
+    parts = [int(part) for part in checkin_time.split(':')]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+def plan_slots(accounts):
+    """Daily check-in time per account id (HH:MM or HH:MM:SS)
+    
+    With SCHEDULE_SPREAD, accounts without a check-in time (and with
+    SCHEDULE_SPREAD_DEFAULT, those stored at the old default) are spaced evenly
+    over SCHEDULE_SPREAD_WINDOW in the order of a hash of their id, so each keeps
+    its relative place and the rest shift a little as accounts come and go.
+    """
+    slots, floating = {}, []
+    for account in accounts:
+        if SCHEDULE_SPREAD and (not account['checkin_time'] or
+                                (SCHEDULE_SPREAD_DEFAULT and account['checkin_time'] == DEFAULT_CHECKIN_TIME)):
+            floating.append(account['id'])
+        else:
+            slots[account['id']] = account_slot(account)
+    if floating:
+        window_start, window_end = (_seconds(part.strip()) for part in SCHEDULE_SPREAD_WINDOW.split('-'))
+        length = (window_end - window_start) % 86400 or 86400
+        step = length / len(floating)
+        floating.sort(key=lambda account_id: hashlib.sha1(str(account_id).encode()).hexdigest())
+        for i, account_id in enumerate(floating):
+            second = int(window_start + i * step) % 86400
+            slots[account_id] = f'{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}'
+    return slots
+
+def next_slot(checkin_time, now):
+    second = _seconds(checkin_time)
+    slot = now.replace(hour=second // 3600, minute=second // 60 % 60, second=second % 60, microsecond=0)
+    return slot if slot >= now else slot + timedelta(days=1)
+
+# Warms connections and account rows shortly before accounts' check-in slots
+class Prewarmer:
+    def __init__(self, connections=CHECKIN_WORKERS):
+        self.connections = connections
+        self.lock = threading.Lock()
+        self.accounts = {}  # account id -> (row, loaded at)
+        self.warmed = set()  # (account id, slot) already loaded
+        self.connections_warmed_at = 0
+    
+    def tick(self):
+        # Record the version before loading rows so a later bump drops them
+        cache_version.sync()
+        now = datetime.now()
+        rows = db.fetchall('SELECT id, checkin_time FROM accounts WHERE enabled = 1')
+        upcoming = {}
+        for account_id, checkin_time in plan_slots(rows).items():
+            slot = next_slot(checkin_time, now)
+            if (slot - now).total_seconds() <= PREWARM_LEAD and (account_id, slot) not in self.warmed:
+                upcoming[account_id] = slot
+        if upcoming:
+            self.warmed = {entry for entry in self.warmed if entry[1] >= now}
+            self.warmed.update(upcoming.items())
+            self.warm(sorted(upcoming))
+    
+    def warm(self, account_ids):
+        start = time.perf_counter()
+        rows = []
+        for offset in range(0, len(account_ids), 500):
+            chunk = account_ids[offset:offset + 500]
+            rows += db.fetchall(f"SELECT * FROM accounts WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+        loaded_at = time.time()
+        with self.lock:
+            self.accounts = {account_id: entry for account_id, entry in self.accounts.items()
+                             if loaded_at - entry[1] <= PREWARM_LEAD * 2}
+            self.accounts.update((row['id'], (row, loaded_at)) for row in rows)
+        
+        # Connections stay warm while check-ins keep using them; only reopen after a quiet spell
+        opened = 0
+        if loaded_at - self.connections_warmed_at > PREWARM_LEAD:
+            opened = http_transport.warm_up([MAIN_SITE, CHECKIN_URL], connections=min(len(rows), self.connections))
+            self.connections_warmed_at = loaded_at
+        logger.info(f"Pre-warmed {len(rows)} upcoming accounts, {opened} connections opened "
+                    f"in {time.perf_counter() - start:.2f}s")
+        
+        if PREWARM_VALIDATE:
+            self.validate(rows)
+    
+    def validate(self, rows):
+        """Probe the slot's tokens in parallel so dead ones show up before the slot"""
+        def probe(row):
+            account_data = {'token_data': json.loads(row['token_data']), 'enabled': True}
+            checkin = LeafLowTokenCheckin(config=checkin_config(account_data))
+            session = checkin.create_session(account_data['token_data'])
+            return row['name'], checkin.test_authentication(session, row['name'])
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.connections)) as executor:
+            for name, (valid, message) in executor.map(probe, rows):
+                if not valid:
+                    logger.warning(f"Pre-check: token for {name} looks dead - {message}")
+    
+    def take(self, account_id):
+        """Account row loaded by a recent warm-up, if still fresh"""
+        with self.lock:
+            row, loaded_at = self.accounts.pop(account_id, (None, 0))
+        return row if time.time() - loaded_at <= PREWARM_LEAD * 2 else None
+    
+    def forget(self, account_id=None):
+        with self.lock:
+            if account_id is None:
+                self.accounts = {}
+            else:
+                self.accounts.pop(account_id, None)
+
+# Worker threads pulling check-in jobs from the queue
+class CheckinWorkerPool:
+    def __init__(self, threads=CHECKIN_WORKERS):
+        self.threads = threads
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.workers = []
+        self.running = False
+        self.prewarmer = Prewarmer(threads)
+    
+    def start(self):
+        if not self.running:
+            self.running = True
+            for i in range(self.threads):
+                worker = threading.Thread(target=self._run_worker, name=f'checkin-worker-{i}', daemon=True)
+                worker.start()
+                self.workers.append(worker)
+            if PREWARM_LEAD > 0:
+                threading.Thread(target=self._run_prewarmer, name='checkin-prewarm', daemon=True).start()
+            logger.info(f"Started {self.threads} check-in workers ({self.owner})")
+    
+    def stop(self, timeout=None):
+        self.running = False
+        deadline = time.time() + timeout if timeout is not None else None
+        for worker in self.workers:
+            worker.join(timeout=None if deadline is None else max(0, deadline - time.time()))
+        self.workers = []
+        logger.info("Check-in workers stopped")
+    
+    def _run_worker(self):
+        while self.running:
+            try:
+                job = job_queue.claim(self.owner)
+            except Exception as e:
+                logger.error(f"Job claim error: {str(e)}")
+                job = None
+            
+            if job is None:
+                time.sleep(WORKER_POLL_INTERVAL)
+                continue
+            
+            job_id, account_id, claim, force = job
+            metrics.workers_busy.inc()
+            try:
+                # Drops pre-warmed rows if another process changed accounts since they were loaded
+                cache_version.sync()
+                scheduler.process_job(job_id, account_id, claim, self.prewarmer.take(account_id), force)
+            except Exception as e:
+                # The claim expires and the reaper puts the job back in the queue
+                logger.error(f"Job {job_id} error: {str(e)}")
+            finally:
+                metrics.workers_busy.dec()
+    
+    def _run_prewarmer(self):
+        while self.running:
+            try:
+                self.prewarmer.tick()
+            except Exception as e:
+                logger.error(f"Pre-warm error: {str(e)}")
+            time.sleep(15)
+
 # Scheduler for automatic check-ins
 class CheckinScheduler:
     def __init__(self):
         self.scheduler_thread = None
         self.running = False
+        self.lease = LeaderLease(alive=lambda: self.scheduler_thread is not None and self.scheduler_thread.is_alive())
+        self.schedule_version = None
+        self.slots = {}
+        self.catchup_thread = None
         
     def start(self):
         if not self.running:
             self.running = True
             self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
             self.scheduler_thread.start()
+            self.lease.start()
             logger.info("Scheduler started")
     
     def stop(self):
         self.running = False
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        self.lease.stop()
         logger.info("Scheduler stopped")
     
     def _run_scheduler(self):
+        was_leader = False
         while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            if self.lease.is_leader.is_set():
+                # Rebuild jobs on takeover (so overdue jobs from the follower
+                # period don't all fire at once) and when another process
+                # changed the accounts; a failed rebuild is retried next tick
+                try:
+                    if not was_leader or self._current_version() != self.schedule_version:
+                        self.schedule_checkins()
+                except Exception as e:
+                    logger.error(f"Schedule rebuild error: {str(e)}")
+                    time.sleep(LEASE_HEARTBEAT)
+                    continue
+                if not was_leader and CATCHUP_ENABLED and not (self.catchup_thread and self.catchup_thread.is_alive()):
+                    self.catchup_thread = threading.Thread(target=self.catch_up, name='checkin-catchup', daemon=True)
+                    self.catchup_thread.start()
+                was_leader = True
+                idle = schedule.idle_seconds()
+                metrics.scheduler_lag_seconds.set(max(0, -idle) if idle is not None else 0)
+                try:
+                    # A job that raises stays due and runs again next tick
+                    schedule.run_pending()
+                except Exception as e:
+                    logger.error(f"Scheduled job error: {str(e)}")
+                try:
+                    job_queue.reap()
+                except Exception as e:
+                    logger.error(f"Job reaper error: {str(e)}")
+            else:
+                was_leader = False
+            time.sleep(LEASE_HEARTBEAT)
+    
+    def _current_version(self):
+        row = db.fetchone('SELECT version FROM scheduler_lock WHERE name = ?', (self.lease.name,))
+        return row[0] if row else 0
+    
+    def reschedule(self):
+        """Rebuild the schedule after account changes and tell other processes"""
+        cache_version.bump()
+        self.schedule_checkins()
     
     def schedule_checkins(self):
-        schedule.clear()
+        # Read everything before touching the jobs so a DB error leaves the old schedule in place
+        version = self._current_version()
         accounts = db.fetchall('SELECT * FROM accounts WHERE enabled = 1')
+        schedule.clear()
+        self.schedule_version = version
+        previous, self.slots = self.slots, plan_slots(accounts)
         
         for account in accounts:
-            checkin_time = account['checkin_time'] if 'checkin_time' in account else '01:00'
-            schedule.every().day.at(checkin_time).do(self.perform_checkin, account['id'])
-            logger.info(f"Scheduled check-in for account {account['name']} at {checkin_time}")
+            checkin_time = self.slots[account['id']]
+            schedule.every().day.at(checkin_time).do(job_queue.enqueue, account['id'])
+            logger.debug(f"Scheduled check-in for account {account['name']} at {checkin_time}")
+        if accounts:
+            per_minute = {}
+            for checkin_time in self.slots.values():
+                per_minute[checkin_time[:5]] = per_minute.get(checkin_time[:5], 0) + 1
+            logger.info(f"Scheduled {len(accounts)} check-ins, at most {max(per_minute.values())} in any minute")
+        self.queue_moved(previous)
+    
+    def queue_moved(self, previous):
+        """Queue accounts a rebuild moved from later today to a time that already passed"""
+        now = datetime.now()
+        moved = {account_id for account_id, checkin_time in self.slots.items()
+                 if account_id in previous and next_slot(previous[account_id], now).date() == now.date()
+                 and next_slot(checkin_time, now).date() > now.date()}
+        if not moved:
+            return
+        try:
+            missed = [row['id'] for row in self.missed_accounts() if row['id'] in moved]
+            for account_id in missed:
+                job_queue.enqueue(account_id)
+        except Exception as e:
+            logger.error(f"Error queueing check-ins moved into the past: {str(e)}")
+            return
+        if missed:
+            logger.info(f"Queued {len(missed)} check-ins whose new slot already passed today")
+    
+    def missed_accounts(self):
+        """Enabled accounts whose slot already passed today without a successful check-in"""
+        now = datetime.now()
+        rows = db.fetchall('''
+            SELECT * FROM accounts a
+            WHERE a.enabled = 1 AND NOT EXISTS (
+                SELECT 1 FROM checkin_history ch
+                WHERE ch.account_id = a.id AND ch.checkin_date = ? AND ch.success = 1
+            )
+        ''', (now.date(),))
+        slots = plan_slots(db.fetchall('SELECT id, checkin_time FROM accounts WHERE enabled = 1'))
+        return [row for row in rows if next_slot(slots.get(row['id'], account_slot(row)), now).date() > now.date()]
+    
+    def catch_up(self):
+        """Queue today's missed check-ins a few at a time so a restart neither loses a day nor floods LeafLow"""
+        try:
+            missed = self.missed_accounts()
+        except Exception as e:
+            logger.error(f"Catch-up sweep error: {str(e)}")
+            return
+        if not missed:
+            return
+        
+        logger.info(f"Catching up {len(missed)} check-ins missed earlier today ({CATCHUP_CONCURRENCY} at a time)")
+        queued = 0
+        for account in missed:
+            # Wait for room in the queue; stop if this process is no longer the leader
+            while self.running and self.lease.is_leader.is_set():
+                active = db.fetchone("SELECT COUNT(*) FROM checkin_jobs WHERE status IN ('pending', 'running')")[0]
+                if active < CATCHUP_CONCURRENCY:
+                    break
+                time.sleep(WORKER_POLL_INTERVAL)
+            else:
+                logger.warning(f"Catch-up interrupted after {queued}/{len(missed)} accounts")
+                return
+            if job_queue.enqueue(account['id']):
+                queued += 1
+        logger.info(f"Catch-up queued {queued} check-ins")
+    
+    def run_checkin(self, account, stats):
+        """Check in one account and return (success, message); run metrics go into stats"""
+        # Add random delay for multiple accounts
+        delay = random.randint(CHECKIN_DELAY_MIN, CHECKIN_DELAY_MAX)
+        if delay > 0:
+            time.sleep(delay)
+        
+        # Prepare account data for check-in
+        token_data = json.loads(account['token_data'])
+        account_data = {'token_data': token_data, 'enabled': True}
+        
+        # Perform check-in (timed without the random delay)
+        start = time.perf_counter()
+        try:
+            checkin = LeafLowTokenCheckin(config=checkin_config(account_data))
+            result = checkin.perform_token_checkin(account_data, account['name'], stats)
+        finally:
+            stats['duration_ms'] = int((time.perf_counter() - start) * 1000)
+        
+        if stats.get('cookies_refreshed'):
+            self.save_token_data(account, account_data['token_data'])
+        return result
+    
+    def save_token_data(self, account, token_data):
+        """Persist cookies rotated by LeafLow unless the stored token was edited meanwhile"""
+        try:
+            updated = history_writer.run(lambda execute: execute('''
+                UPDATE accounts SET token_data = ? WHERE id = ? AND token_data = ?
+            ''', (json.dumps(token_data), account['id'], account['token_data'])).rowcount)
+            invalidate_account(account['id'])
+            if updated:
+                logger.info(f"Saved refreshed cookies for {account['name']}")
+        except Exception as e:
+            logger.error(f"Failed to save refreshed cookies for {account['name']}: {str(e)}")
+    
+    def _notify_and_finish(self, account, history_id, success, message, stats):
+        start = time.perf_counter()
+        self.send_notification(account['name'], success, message)
+        notify_ms = int((time.perf_counter() - start) * 1000)
+        finish_history(history_id, notify_ms, stats.get('duration_ms', 0) + notify_ms)
+        logger.info(f"Check-in for {account['name']}: {'Success' if success else 'Failed'} - {message} ({stats.get('duration_ms', 0) + notify_ms} ms)")
     
-    def perform_checkin(self, account_id):
-        account = db.fetchone('SELECT * FROM accounts WHERE id = ?', (account_id,))
+    def process_job(self, job_id, account_id, claim, account=None, force=False):
+        """Run a queued check-in job claimed by a worker (account may be preloaded)"""
+        if account is None:
+            account = account_cache.get(account_id)
         if not account or not account['enabled']:
+            logger.info(f"Account {account_id} removed or disabled, dropping its queued check-in")
+            job_queue.skip(job_id, claim)
+            return
+        if not force and checked_in_today(account_id):
+            metrics.checkin_skipped.inc()
+            logger.info(f"Account {account['name']} already checked in today, skipping")
+            job_queue.skip(job_id, claim)
             return
         
+        stats = {}
         try:
-            # Add random delay for multiple accounts
-            delay = random.randint(30, 60)
-            time.sleep(delay)
-            
-            # Prepare account data for check-in
-            token_data = json.loads(account['token_data'])
-            account_data = {'token_data': token_data, 'enabled': True}
-            
-            # Create temporary config
-            temp_config = {
-                'settings': {
-                    'log_level': 'INFO',
-                    'retry_delay': 3,
-                    'timeout': 30,
-                    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                },
-                'accounts': [account_data]
-            }
-            
-            # Save temporary config
-            with open('temp_config.json', 'w') as f:
-                json.dump(temp_config, f)
-            
-            # Perform check-in
-            checkin = LeafLowTokenCheckin('temp_config.json')
-            success, message = checkin.perform_token_checkin(account_data, account['name'])
+            success, message = self.run_checkin(account, stats)
+        except Exception as e:
+            logger.error(f"Check-in error for account {account_id}: {str(e)}")
+            job_queue.complete(job_id, claim, account_id, False, str(e), stats)
+            return
+        
+        history_id = job_queue.complete(job_id, claim, account_id, success, message, stats)
+        if history_id is None:
+            logger.warning(f"Lease lost for check-in job {job_id}, result discarded")
+            return
+        
+        self._notify_and_finish(account, history_id, success, message, stats)
+    
+    def perform_checkin(self, account_id, force=False):
+        """Check in an account right away (manual trigger); returns False if skipped"""
+        account = account_cache.get(account_id)
+        if not account or not account['enabled']:
+            return False
+        if not force and checked_in_today(account_id):
+            metrics.checkin_skipped.inc()
+            logger.info(f"Account {account['name']} already checked in today, skipping (use force to run anyway)")
+            return False
+        
+        stats = {}
+        try:
+            success, message = self.run_checkin(account, stats)
             
             # Record history
-            db.execute('''
-                INSERT INTO checkin_history (account_id, success, message, checkin_date)
-                VALUES (?, ?, ?, ?)
-            ''', (account_id, success, message, datetime.now().date()))
+            history_id = history_writer.run(lambda execute: insert_history(execute, account_id, success, message, stats))
             
             # Send notification if enabled
-            self.send_notification(account['name'], success, message)
-            
-            logger.info(f"Check-in for {account['name']}: {'Success' if success else 'Failed'} - {message}")
+            self._notify_and_finish(account, history_id, success, message, stats)
             
         except Exception as e:
             logger.error(f"Check-in error for account {account_id}: {str(e)}")
-            db.execute('''
-                INSERT INTO checkin_history (account_id, success, message, checkin_date)
-                VALUES (?, ?, ?, ?)
-            ''', (account_id, False, str(e), datetime.now().date()))
+            history_writer.run(lambda execute: insert_history(execute, account_id, False, str(e), stats))
+        return True
     
     def send_notification(self, account_name, success, message):
-        settings = db.fetchone('SELECT * FROM notification_settings WHERE id = 1')
+        settings = notification_settings_cache.get(1)
         if not settings or not settings['enabled']:
             return
         
@@ -265,11 +1040,50 @@ class CheckinScheduler:
             logger.error(f"Notification error: {str(e)}")
 
 scheduler = CheckinScheduler()
+workers = CheckinWorkerPool()
+
+# Prebuilt static asset: compressed once, served with strong ETags
+class StaticAsset:
+    def __init__(self, content, mimetype):
+        data = content.encode('utf-8')
+        self.mimetype = mimetype
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        # Each encoding is a different representation, so each gets its own ETag
+        self.variants = {'identity': (data, digest)}
+        self.variants['gzip'] = (gzip.compress(data, 9), f'{digest}-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(data, quality=11), f'{digest}-br')
+    
+    def response(self):
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in self.variants and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+        data, etag = self.variants[encoding]
+        
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(data, mimetype=self.mimetype, headers=headers)
 
 # Routes
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return index_page.response()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'message': 'Token is invalid!'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -297,7 +1111,8 @@ def dashboard():
     # Today's check-ins
     today = datetime.now().date()
     today_checkins = db.fetchall('''
-        SELECT a.name, ch.success, ch.message, ch.created_at
+        SELECT a.name, ch.success, ch.message, ch.created_at,
+               ch.duration_ms, ch.http_requests, ch.endpoint
         FROM checkin_history ch
         JOIN accounts a ON ch.account_id = a.id
         WHERE ch.checkin_date = ?
@@ -329,11 +1144,115 @@ def dashboard():
         'recent_history': [dict(row) for row in recent_history]
     })
 
+@app.route('/api/history', methods=['GET'])
+@token_required
+def get_history():
+    account_id = request.args.get('account_id', type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    
+    query = '''
+        SELECT ch.id, ch.account_id, a.name, ch.success, ch.message, ch.checkin_date, ch.created_at,
+               ch.duration_ms, ch.session_ms, ch.auth_ms, ch.checkin_ms, ch.notify_ms,
+               ch.http_requests, ch.bytes_downloaded, ch.endpoint
+        FROM checkin_history ch
+        JOIN accounts a ON ch.account_id = a.id
+    '''
+    params = []
+    if account_id is not None:
+        query += ' WHERE ch.account_id = ?'
+        params.append(account_id)
+    query += ' ORDER BY ch.id DESC LIMIT ?'
+    params.append(limit)
+    
+    rows = db.fetchall(query, params)
+    return jsonify([dict(row) for row in rows])
+
+HISTORY_EXPORT_COLUMNS = ['id', 'account_id', 'name', 'success', 'message', 'checkin_date', 'created_at',
+                          'duration_ms', 'session_ms', 'auth_ms', 'checkin_ms', 'notify_ms',
+                          'http_requests', 'bytes_downloaded', 'endpoint']
+
+def iter_history(account_id=None, date_from=None, date_to=None):
+    """Yield history rows in id order, one short keyset-paginated query per batch"""
+    conditions, params = ['ch.id > ?'], []
+    if account_id is not None:
+        conditions.append('ch.account_id = ?')
+        params.append(account_id)
+    if date_from:
+        conditions.append('ch.checkin_date >= ?')
+        params.append(date_from)
+    if date_to:
+        conditions.append('ch.checkin_date <= ?')
+        params.append(date_to)
+    query = f'''
+        SELECT ch.id, ch.account_id, a.name, ch.success, ch.message, ch.checkin_date, ch.created_at,
+               ch.duration_ms, ch.session_ms, ch.auth_ms, ch.checkin_ms, ch.notify_ms,
+               ch.http_requests, ch.bytes_downloaded, ch.endpoint
+        FROM checkin_history ch
+        LEFT JOIN accounts a ON ch.account_id = a.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY ch.id LIMIT ?
+    '''
+    last_id = 0
+    while True:
+        rows = db.fetchall(query, [last_id] + params + [EXPORT_BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+def export_chunks(batches, fmt):
+    """Encode batches of history rows as NDJSON or CSV text chunks"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(HISTORY_EXPORT_COLUMNS)
+        for rows in batches:
+            writer.writerows(tuple(row) for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for rows in batches:
+            yield ''.join(json.dumps(dict(zip(HISTORY_EXPORT_COLUMNS, row)), ensure_ascii=False, default=str) + '\n'
+                          for row in rows)
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/history/export', methods=['GET'])
+@token_required
+def export_history():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+    try:
+        date_from, date_to = (datetime.strptime(request.args[key], '%Y-%m-%d').date() if request.args.get(key) else None
+                              for key in ('from', 'to'))
+    except ValueError:
+        return jsonify({'message': 'from/to must be YYYY-MM-DD dates'}), 400
+    
+    chunks = export_chunks(iter_history(request.args.get('account_id', type=int), date_from, date_to), fmt)
+    headers = {'Content-Disposition': f'attachment; filename=checkin_history.{fmt}'}
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
 @app.route('/api/accounts', methods=['GET'])
 @token_required
 def get_accounts():
     accounts = db.fetchall('SELECT id, name, enabled, checkin_time, created_at FROM accounts')
-    return jsonify([dict(row) for row in accounts])
+    slots = plan_slots([account for account in accounts if account['enabled']])
+    return jsonify([dict(account, scheduled_at=slots.get(account['id'])) for account in accounts])
 
 @app.route('/api/accounts', methods=['POST'])
 @token_required
@@ -341,7 +1260,7 @@ def add_account():
     data = request.json
     name = data.get('name')
     token_data = data.get('token_data')
-    checkin_time = data.get('checkin_time', '01:00')
+    checkin_time = data.get('checkin_time') or None
     
     if not name or not token_data:
         return jsonify({'message': 'Name and token_data are required'}), 400
@@ -352,7 +1271,7 @@ def add_account():
             VALUES (?, ?, ?)
         ''', (name, json.dumps(token_data), checkin_time))
         
-        scheduler.schedule_checkins()
+        scheduler.reschedule()
         return jsonify({'message': 'Account added successfully'})
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 400
@@ -371,7 +1290,7 @@ def update_account(account_id):
     
     if 'checkin_time' in data:
         updates.append('checkin_time = ?')
-        params.append(data['checkin_time'])
+        params.append(data['checkin_time'] or None)
     
     if 'token_data' in data:
         updates.append('token_data = ?')
@@ -385,7 +1304,8 @@ def update_account(account_id):
             WHERE id = ?
         ''', params)
         
-        scheduler.schedule_checkins()
+        invalidate_account(account_id)
+        scheduler.reschedule()
         return jsonify({'message': 'Account updated successfully'})
     
     return jsonify({'message': 'No updates provided'}), 400
@@ -395,9 +1315,132 @@ def update_account(account_id):
 def delete_account(account_id):
     db.execute('DELETE FROM checkin_history WHERE account_id = ?', (account_id,))
     db.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
-    scheduler.schedule_checkins()
+    invalidate_account(account_id)
+    scheduler.reschedule()
     return jsonify({'message': 'Account deleted successfully'})
 
+BULK_FILTER_KEYS = {'enabled': (bool, int), 'checkin_time': str, 'name_prefix': str}
+
+def _selection_error(data):
+    """Why a bulk request's account selection is invalid, or None"""
+    if sum(key in data for key in ('ids', 'filter', 'all')) != 1:
+        return 'exactly one of ids, filter or all is required'
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(account_id, int) and not isinstance(account_id, bool)
+                                                for account_id in ids):
+            return 'ids must be a list of integers'
+    elif 'filter' in data:
+        account_filter = data['filter']
+        if not isinstance(account_filter, dict):
+            return 'filter must be an object'
+        for key, value in account_filter.items():
+            if key not in BULK_FILTER_KEYS:
+                return f"unknown filter '{key}', expected {', '.join(BULK_FILTER_KEYS)}"
+            if not isinstance(value, BULK_FILTER_KEYS[key]):
+                return f'invalid filter value for {key}'
+    elif data['all'] is not True:
+        return 'all must be true'
+    return None
+
+def _select_accounts(execute, data):
+    """Account ids chosen by a bulk request: explicit ids, a filter, or all ({"all": true} or "filter": {})"""
+    if data.get('all'):
+        return [row[0] for row in execute('SELECT id FROM accounts ORDER BY id').fetchall()]
+    if 'ids' in data:
+        ids = data['ids']
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows += execute(f"SELECT id FROM accounts WHERE id IN ({', '.join('?' for _ in chunk)})", chunk).fetchall()
+        return [row[0] for row in rows]
+    
+    conditions, params = [], []
+    account_filter = data['filter']
+    if 'enabled' in account_filter:
+        conditions.append('enabled = ?')
+        params.append(bool(account_filter['enabled']))
+    if 'checkin_time' in account_filter:
+        conditions.append("COALESCE(checkin_time, '01:00') = ?")
+        params.append(account_filter['checkin_time'])
+    if 'name_prefix' in account_filter:
+        conditions.append('name LIKE ?')
+        params.append(account_filter['name_prefix'] + '%')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return [row[0] for row in execute(f'SELECT id FROM accounts {where} ORDER BY id', params).fetchall()]
+
+@app.route('/api/accounts/bulk', methods=['POST'])
+@token_required
+def bulk_accounts():
+    """Update many accounts in one transaction and/or queue check-ins for them"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'message': 'JSON object body is required'}), 400
+    error = _selection_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+    
+    updates, params = [], []
+    changes = data.get('update', {})
+    if not isinstance(changes, dict):
+        return jsonify({'message': 'update must be an object'}), 400
+    if 'enabled' in changes:
+        if not isinstance(changes['enabled'], (bool, int)) or changes['enabled'] not in (0, 1):
+            return jsonify({'message': 'enabled must be true/false or 0/1'}), 400
+        updates.append('enabled = ?')
+        params.append(int(changes['enabled']))
+    if 'checkin_time' in changes:
+        try:
+            if changes['checkin_time'] is not None:
+                datetime.strptime(changes['checkin_time'], '%H:%M')
+        except (TypeError, ValueError):
+            return jsonify({'message': 'checkin_time must be HH:MM or null'}), 400
+        updates.append('checkin_time = ?')
+        params.append(changes['checkin_time'])
+    if 'token_data' in changes:
+        updates.append('token_data = ?')
+        params.append(json.dumps(changes['token_data']))
+    
+    with db.transaction() as execute:
+        account_ids = _select_accounts(execute, data)
+        if updates and account_ids:
+            for start in range(0, len(account_ids), 500):
+                chunk = account_ids[start:start + 500]
+                execute(f'''
+                    UPDATE accounts
+                    SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({', '.join('?' for _ in chunk)})
+                ''', params + chunk)
+    
+    result = {'matched': len(account_ids), 'updated': len(account_ids) if updates else 0}
+    if updates and account_ids:
+        invalidate_account()
+        scheduler.reschedule()
+    
+    if data.get('checkin'):
+        enabled = []
+        for start in range(0, len(account_ids), 500):
+            chunk = account_ids[start:start + 500]
+            enabled += [row[0] for row in db.fetchall(
+                f"SELECT id FROM accounts WHERE enabled = 1 AND id IN ({', '.join('?' for _ in chunk)})", chunk)]
+        batch_id = uuid.uuid4().hex
+        queued = job_queue.enqueue_many(enabled, batch_id, force=bool(data.get('force')))
+        result.update(batch_id=batch_id, queued=len(queued))
+    
+    return jsonify(result)
+
+@app.route('/api/checkin/batch/<batch_id>', methods=['GET'])
+@token_required
+def checkin_batch_status(batch_id):
+    """Progress of a bulk check-in: job counts by status"""
+    rows = db.fetchall('SELECT status, COUNT(*) FROM checkin_jobs WHERE batch_id = ? GROUP BY status', (batch_id,))
+    if not rows:
+        return jsonify({'message': 'Batch not found'}), 404
+    counts = {status: 0 for status in ('pending', 'running', 'done', 'failed')}
+    counts.update({row[0]: row[1] for row in rows})
+    return jsonify({'batch_id': batch_id, 'total': sum(counts.values()), 'jobs': counts,
+                    'finished': counts['pending'] == 0 and counts['running'] == 0})
+
 @app.route('/api/notification', methods=['GET'])
 @token_required
 def get_notification_settings():
@@ -422,13 +1465,24 @@ def update_notification_settings():
         data.get('telegram_user_id', ''),
         data.get('wechat_webhook_key', '')
     ))
+    notification_settings_cache.invalidate()
+    cache_version.bump()
     
     return jsonify({'message': 'Notification settings updated'})
 
 @app.route('/api/checkin/manual/<int:account_id>', methods=['POST'])
 @token_required
 def manual_checkin(account_id):
-    scheduler.perform_checkin(account_id)
+    account = account_cache.get(account_id)
+    if not account:
+        return jsonify({'message': 'Account not found'}), 404
+    if not account['enabled']:
+        return jsonify({'message': 'Account is disabled'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    force = request.args.get('force') in ('1', 'true') or bool(data.get('force'))
+    if not scheduler.perform_checkin(account_id, force=force):
+        return jsonify({'message': 'Account already checked in today', 'skipped': True})
     return jsonify({'message': 'Manual check-in triggered'})
 
 # HTML Template
@@ -534,6 +1588,7 @@ HTML_TEMPLATE = '''
                         <th>Account</th>
                         <th>Status</th>
                         <th>Message</th>
+                        <th>Duration</th>
                         <th>Time</th>
                     </tr>
                 </thead>
@@ -595,8 +1650,8 @@ HTML_TEMPLATE = '''
                     <input type="text" id="accountName" required>
                 </div>
                 <div class="form-group">
-                    <label>Check-in Time</label>
-                    <input type="time" id="checkinTime" value="01:00" required>
+                    <label>Check-in Time (optional)</label>
+                    <input type="time" id="checkinTime">
                 </div>
                 <div class="form-group">
                     <label>Token Data (JSON)</label>
@@ -692,6 +1747,7 @@ HTML_TEMPLATE = '''
                     <td>${checkin.name}</td>
                     <td><span class="badge ${checkin.success ? 'badge-success' : 'badge-danger'}">${checkin.success ? 'Success' : 'Failed'}</span></td>
                     <td>${checkin.message}</td>
+                    <td>${checkin.duration_ms != null ? (checkin.duration_ms / 1000).toFixed(1) + 's' : '-'}</td>
                     <td>${new Date(checkin.created_at).toLocaleTimeString()}</td>
                 `;
                 tbody.appendChild(tr);
@@ -715,7 +1771,8 @@ HTML_TEMPLATE = '''
                         </label>
                     </td>
                     <td>
-                        <input type="time" value="${account.checkin_time}" onchange="updateCheckinTime(${account.id}, this.value)" style="border: 1px solid #ddd; padding: 4px; border-radius: 4px;">
+                        <input type="time" value="${account.checkin_time || account.scheduled_at || ''}" onchange="updateCheckinTime(${account.id}, this.value)" style="border: 1px solid #ddd; padding: 4px; border-radius: 4px;">
+                        ${account.checkin_time ? '' : '<span style="color: #999; font-size: 12px;">auto</span>'}
                     </td>
                     <td>
                         <button class="btn btn-sm" onclick="manualCheckin(${account.id})">Check-in Now</button>
@@ -753,7 +1810,10 @@ HTML_TEMPLATE = '''
 
         async function manualCheckin(id) {
             if (confirm('Perform manual check-in for this account?')) {
-                const result = await apiCall(`/api/checkin/manual/${id}`, { method: 'POST' });
+                let result = await apiCall(`/api/checkin/manual/${id}`, { method: 'POST' });
+                if (result.skipped && confirm(`${result.message}. Check in anyway?`)) {
+                    result = await apiCall(`/api/checkin/manual/${id}?force=1`, { method: 'POST' });
+                }
                 alert(result.message);
                 setTimeout(loadDashboard, 2000);
             }
@@ -796,7 +1856,7 @@ HTML_TEMPLATE = '''
                 const tokenData = JSON.parse(document.getElementById('tokenData').value);
                 const account = {
                     name: document.getElementById('accountName').value,
-                    checkin_time: document.getElementById('checkinTime').value,
+                    checkin_time: document.getElementById('checkinTime').value || null,
                     token_data: tokenData
                 };
 
@@ -826,11 +1886,74 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
+index_page = StaticAsset(HTML_TEMPLATE, 'text/html')
+
+def serve_production():
+    """Run the panel on waitress and drain in-flight requests on SIGTERM/SIGINT"""
+    from waitress import create_server
+    
+    server = create_server(
+        app,
+        host='0.0.0.0',
+        port=PORT,
+        threads=SERVER_THREADS,
+        channel_timeout=SERVER_CHANNEL_TIMEOUT,
+        connection_limit=SERVER_CONNECTION_LIMIT,
+        ident='leaflow-checkin',
+    )
+    draining = threading.Event()
+    
+    def drain():
+        dispatcher = server.task_dispatcher
+        deadline = time.time() + SHUTDOWN_TIMEOUT
+        while (dispatcher.active_count or dispatcher.queue) and time.time() < deadline:
+            time.sleep(0.1)
+        # Delivered as SIGINT to request_shutdown below
+        _thread.interrupt_main()
+    
+    def request_shutdown(signum, frame):
+        if draining.is_set():
+            # Drain finished (or a second signal): waitress stops its loop on KeyboardInterrupt
+            raise KeyboardInterrupt
+        draining.set()
+        logger.info("Shutdown requested, draining in-flight requests")
+        server.accepting = False
+        threading.Thread(target=drain, daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+    
+    logger.info(f"Starting control panel on port {PORT} (waitress, {SERVER_THREADS} threads)")
+    server.run()
+
+def wait_for_shutdown():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    while not stop.is_set():
+        stop.wait(1)
+
 if __name__ == '__main__':
-    # Start scheduler
-    scheduler.start()
-    scheduler.schedule_checkins()
+    # Start check-in workers
+    workers.start()
+    
+    if APP_ROLE == 'worker':
+        # Worker-only node: no panel, no scheduler
+        wait_for_shutdown()
+    else:
+        # Start scheduler
+        scheduler.start()
+        scheduler.schedule_checkins()
+        
+        if SERVER_MODE == 'production':
+            serve_production()
+        else:
+            # Start Flask app
+            logger.info(f"Starting control panel on port {PORT}")
+            app.run(host='0.0.0.0', port=PORT, debug=False)
+        scheduler.stop()
     
-    # Start Flask app
-    logger.info(f"Starting control panel on port {PORT}")
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    # Let running check-in jobs finish; unfinished leases are reclaimed by other workers
+    logger.info("Waiting for in-flight check-in jobs")
+    workers.stop(timeout=SHUTDOWN_TIMEOUT)
+    history_writer.flush(timeout=SHUTDOWN_TIMEOUT)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Control panel API load benchmark
+Seeds a database with synthetic accounts and history, then drives the Flask
+API with concurrent clients and reports requests/s and latency percentiles
+
+Usage:
+    python benchmarks/bench_api.py --accounts 1000 --history 1000000 --clients 16
+    python benchmarks/bench_api.py --url http://localhost:8181 --reset
+
+Without --url the panel runs in-process on a scratch SQLite database in a
+temporary directory. --url benchmarks a running panel through the database
+in the current directory, which seeding wipes, so it requires --reset.
+Manual check-ins run against the local LeafLow stand-in server.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from leaflow_stub import LeafLowStub
+from bench_checkin import percentile
+
+SEED_BATCH = 10000
+
+def seed(app, accounts, history):
+    """Replace the database contents with synthetic accounts and history rows"""
+    app.db.execute('DELETE FROM checkin_jobs')
+    app.db.execute('DELETE FROM checkin_history')
+    app.db.execute('DELETE FROM accounts')
+
+    token_data = json.dumps({'cookies': {'leaflow_session': 'valid-session', 'XSRF-TOKEN': 'xsrf'}})
+    with app.db.transaction() as execute:
+        for i in range(accounts):
+            execute('INSERT INTO accounts (name, token_data, checkin_time) VALUES (?, ?, ?)',
+                    (f'seed-{i}', token_data, f'{i % 24:02d}:{i % 60:02d}'))
+    account_ids = [row[0] for row in app.db.fetchall('SELECT id FROM accounts')]
+
+    today = date.today()
+    rows = ((account_ids[i % len(account_ids)], i % 10 != 0, 'Check-in successful!', today - timedelta(days=i % 30))
+            for i in range(history))
+    while True:
+        batch = list(itertools.islice(rows, SEED_BATCH))
+        if not batch:
+            break
+        with app.db.transaction() as execute:
+            for row in batch:
+                execute('INSERT INTO checkin_history (account_id, success, message, checkin_date) VALUES (?, ?, ?, ?)', row)
+    return account_ids
+
+def start_server(app, port):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', port, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def scenarios(account_ids):
+    """Request factories for each benchmarked route: (name, fn(n) -> (method, path, json))"""
+    created = itertools.count()
+    return [
+        ('GET /api/dashboard', lambda n: ('GET', '/api/dashboard', None)),
+        ('GET /api/accounts', lambda n: ('GET', '/api/accounts', None)),
+        ('POST /api/accounts', lambda n: ('POST', '/api/accounts', {
+            'name': f'bench-{os.getpid()}-{next(created)}',
+            'token_data': {'cookies': {'leaflow_session': 'valid-new'}},
+        })),
+        ('PUT /api/accounts/<id>', lambda n: ('PUT', f'/api/accounts/{account_ids[n % len(account_ids)]}', {
+            'checkin_time': f'{n % 24:02d}:{n % 60:02d}',
+        })),
+        ('POST /api/checkin/manual/<id>', lambda n: ('POST', f'/api/checkin/manual/{account_ids[n % len(account_ids)]}', None)),
+        ('DELETE /api/accounts/<id>', lambda n: ('DELETE', f'/api/accounts/{account_ids.pop()}', None)),
+    ]
+
+def run_scenario(base_url, token, factory, requests_count, clients):
+    local = threading.local()
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def client():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.headers['Authorization'] = f'Bearer {token}'
+        while True:
+            with counter_lock:
+                n = next(counter)
+            if n >= requests_count:
+                return
+            method, path, body = factory(n)
+            start = time.perf_counter()
+            try:
+                response = local.session.request(method, base_url + path, json=body, timeout=120)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with counter_lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for future in [executor.submit(client) for _ in range(clients)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': requests_count,
+        'errors': errors[0],
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(requests_count / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='LeafLow control panel API load benchmark')
+    parser.add_argument('--accounts', type=int, default=100, help='Seeded accounts')
+    parser.add_argument('--history', type=int, default=10000, help='Seeded history rows')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route')
+    parser.add_argument('--manual-requests', type=int, default=20, help='Requests for the manual check-in route')
+    parser.add_argument('--url', help='Benchmark an already running panel sharing the same database')
+    parser.add_argument('--reset', action='store_true', help='Allow deleting all accounts, jobs and history of the --url database to seed it')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    if args.url and not args.reset:
+        parser.error('--url seeds the shared database, deleting all accounts, jobs and history; pass --reset to allow it')
+    output = os.path.abspath(args.output) if args.output else None
+
+    stub = LeafLowStub(seed=0)
+    main_site, checkin_url = stub.start()
+    os.environ['DB_TYPE'] = 'sqlite'
+    os.environ['LEAFLOW_MAIN_SITE'] = main_site
+    os.environ['LEAFLOW_CHECKIN_URL'] = checkin_url
+    os.environ['CHECKIN_DELAY_MIN'] = '0'
+    os.environ['CHECKIN_DELAY_MAX'] = '0'
+    if not args.url:
+        os.chdir(tempfile.mkdtemp(prefix='leaflow-bench-'))
+
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"Seeding {args.accounts} accounts and {args.history} history rows...")
+    start = time.perf_counter()
+    account_ids = seed(app, args.accounts, args.history)
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_server(app, 0)
+
+    token = requests.post(f'{base_url}/api/login', json={
+        'username': app.ADMIN_USERNAME, 'password': app.ADMIN_PASSWORD,
+    }, timeout=30).json()['token']
+
+    results = []
+    print(f"{'route':<32} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+    try:
+        for name, factory in scenarios(account_ids):
+            count = args.manual_requests if 'manual' in name else args.requests
+            if name.startswith('DELETE'):
+                count = min(count, len(account_ids))
+            result = dict(route=name, accounts=args.accounts, history=args.history,
+                          clients=args.clients, **run_scenario(base_url, token, factory, count, args.clients))
+            results.append(result)
+            print(f"{name:<32} {result['requests']:>8} {result['errors']:>6} {result['requests_per_s']:>9} "
+                  f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8}")
+    finally:
+        if server:
+            server.shutdown()
+        stub.stop()
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
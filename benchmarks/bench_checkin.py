@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check-in throughput benchmark against the local LeafLow stand-in server
+Drives LeafLowTokenCheckin.run_all_accounts (cli) and the control panel's
+queue workers (scheduler) with synthetic accounts
+
+Usage:
+    python benchmarks/bench_checkin.py --mode both --accounts 10 100 1000 10000
+    python benchmarks/bench_checkin.py --mode scheduler --workers 16 --latency-ms 50
+    python benchmarks/bench_checkin.py --mode scheduler --workers 64 --accounts 10000 --tls --http2
+
+--tls serves the stand-in over HTTPS with ALPN, like the real sites: requests
+then speaks HTTP/1.1 over TLS and --http2 (httpx) negotiates h2, with one
+client and connection per worker thread. Without --tls the stand-in is
+plain HTTP/1.1 and --http2 only measures the httpx backend's overhead.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from leaflow_stub import LeafLowStub
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def synthetic_accounts(count, invalid_rate=0.0):
+    accounts = []
+    invalid_every = int(1 / invalid_rate) if invalid_rate else 0
+    for i in range(count):
+        prefix = 'expired' if invalid_every and i % invalid_every == 0 else 'valid'
+        accounts.append({
+            'token_data': {
+                'cookies': {
+                    'leaflow_session': f'{prefix}-session-{i}',
+                    'XSRF-TOKEN': f'xsrf-{i}',
+                }
+            },
+            'enabled': True,
+        })
+    return accounts
+
+def summarize(mode, count, workers, elapsed, latencies_ms, requests, successes):
+    import http_transport
+
+    return {
+        'mode': mode,
+        'client': 'httpx' if http_transport.use_http2() else 'requests',
+        'accounts': count,
+        'workers': workers,
+        'elapsed_s': round(elapsed, 3),
+        'accounts_per_s': round(count / elapsed, 2) if elapsed else 0,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p99_ms': percentile(latencies_ms, 99),
+        'requests_per_account': round(requests / count, 2) if count else 0,
+        'success': successes,
+    }
+
+def bench_cli(stub, count, args):
+    """Sequential run through LeafLowTokenCheckin.run_all_accounts"""
+    from checkin_token import LeafLowTokenCheckin
+
+    config = {
+        'settings': {
+            'log_level': 'WARNING',
+            'retry_delay': 0,
+            'timeout': 30,
+            'user_agent': 'LeafLow-Benchmark/1.0',
+        },
+        'accounts': synthetic_accounts(count, args.invalid_rate),
+    }
+    checkin = LeafLowTokenCheckin(config=config)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    stub.reset()
+    start = time.perf_counter()
+    success_count, _, results = checkin.run_all_accounts()
+    elapsed = time.perf_counter() - start
+
+    latencies = [
+        sum(result['stats'].get(phase, 0) for phase in ('session_ms', 'auth_ms', 'checkin_ms'))
+        for result in results
+    ]
+    return summarize('cli', count, 1, elapsed, latencies, stub.requests, success_count)
+
+def bench_scheduler(stub, count, args):
+    """Queue every account and let the control panel's check-in workers drain it"""
+    import app
+
+    app.db.execute('DELETE FROM checkin_jobs')
+    app.db.execute('DELETE FROM checkin_history')
+    app.db.execute('DELETE FROM accounts')
+    with app.db.transaction() as execute:
+        for i, account in enumerate(synthetic_accounts(count, args.invalid_rate)):
+            execute('INSERT INTO accounts (name, token_data) VALUES (?, ?)',
+                    (f'bench-{i}', json.dumps(account['token_data'])))
+    for row in app.db.fetchall('SELECT id FROM accounts'):
+        app.job_queue.enqueue(row[0])
+
+    stub.reset()
+    start = time.perf_counter()
+    app.workers.start()
+    while app.db.fetchone("SELECT COUNT(*) FROM checkin_jobs WHERE status IN ('pending', 'running')")[0]:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    app.workers.stop()
+
+    rows = app.db.fetchall('SELECT success, duration_ms FROM checkin_history')
+    latencies = [row[1] or 0 for row in rows]
+    successes = sum(1 for row in rows if row[0])
+    return summarize('scheduler', count, app.workers.threads, elapsed, latencies, stub.requests, successes)
+
+def main():
+    parser = argparse.ArgumentParser(description='LeafLow check-in throughput benchmark')
+    parser.add_argument('--mode', choices=['cli', 'scheduler', 'both'], default='cli')
+    parser.add_argument('--accounts', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--workers', type=int, default=4, help='Check-in workers for scheduler mode')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Stand-in server latency per request')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with 500')
+    parser.add_argument('--already-rate', type=float, default=0, help='Fraction of accounts already checked in')
+    parser.add_argument('--invalid-rate', type=float, default=0, help='Fraction of accounts with expired tokens')
+    parser.add_argument('--http2', action='store_true', help='Use the HTTP/2 (httpx) client backend')
+    parser.add_argument('--tls', action='store_true', help='Serve the stand-in over HTTPS with ALPN (h2 or http/1.1)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    stub = LeafLowStub(args.latency_ms / 1000, args.error_rate, args.already_rate, seed=0, tls=args.tls)
+    main_site, checkin_url = stub.start()
+    if stub.ca_file:
+        # Trust the stand-in's self-signed certificate (requests and httpx)
+        os.environ['REQUESTS_CA_BUNDLE'] = stub.ca_file
+        os.environ['SSL_CERT_FILE'] = stub.ca_file
+    # httpx only negotiates h2 over TLS; on plain http it speaks HTTP/1.1 too
+    protocol = ('h2' if args.http2 else 'http/1.1') + '+tls' if args.tls else 'http/1.1'
+
+    # Point the engine at the stand-in and keep the control panel's files out of the repo
+    os.environ['LEAFLOW_MAIN_SITE'] = main_site
+    os.environ['LEAFLOW_CHECKIN_URL'] = checkin_url
+    os.environ['CHECKIN_DELAY_MIN'] = '0'
+    os.environ['CHECKIN_DELAY_MAX'] = '0'
+    os.environ['CHECKIN_WORKERS'] = str(args.workers)
+    os.environ['WORKER_POLL_INTERVAL'] = '0.01'
+    os.environ['LEAFLOW_HTTP2'] = '1' if args.http2 else '0'
+    os.chdir(tempfile.mkdtemp(prefix='leaflow-bench-'))
+
+    modes = ['cli', 'scheduler'] if args.mode == 'both' else [args.mode]
+    results = []
+    print(f"{'mode':<10} {'client':<8} {'protocol':<12} {'accounts':>8} {'workers':>7} {'elapsed_s':>10} {'acct/s':>9} {'p50_ms':>7} {'p99_ms':>7} {'req/acct':>8} {'success':>8}")
+    try:
+        for mode in modes:
+            for count in args.accounts:
+                result = bench_cli(stub, count, args) if mode == 'cli' else bench_scheduler(stub, count, args)
+                result['protocol'] = protocol
+                results.append(result)
+                print(f"{result['mode']:<10} {result['client']:<8} {result['protocol']:<12} {result['accounts']:>8} {result['workers']:>7} {result['elapsed_s']:>10} "
+                      f"{result['accounts_per_s']:>9} {result['p50_ms']:>7} {result['p99_ms']:>7} "
+                      f"{result['requests_per_account']:>8} {result['success']:>8}")
+    finally:
+        stub.stop()
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
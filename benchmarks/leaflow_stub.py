@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local LeafLow stand-in server for benchmarks
+Mimics leaflow.net (dashboard pages) and checkin.leaflow.net (check-in page
+with CSRF token and API endpoints) on two local ports
+
+Usage:
+    python benchmarks/leaflow_stub.py --latency-ms 50 --error-rate 0.01
+    python benchmarks/leaflow_stub.py --tls
+
+Sessions whose leaflow_session cookie starts with "valid" are authenticated;
+anything else is redirected to /login.
+
+With --tls both sites serve HTTPS with a throwaway self-signed certificate
+(made with the openssl CLI) and negotiate h2 or http/1.1 through ALPN, like
+the real sites. h2 connections multiplex streams, each handled on its own
+thread; this needs the h2 package (pip install 'httpx[http2]'). Clients
+trust the certificate through REQUESTS_CA_BUNDLE / SSL_CERT_FILE=stub.ca_file.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import select
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+except ImportError:
+    h2 = None
+
+LOGIN_PAGE = '<html><head><title>LeafLow</title></head><body><form action="/login">Sign in</form></body></html>'
+DASHBOARD_PAGE = '<html><head><title>Dashboard</title></head><body><h1>Dashboard</h1><p>Welcome back</p><a href="/logout">Logout</a></body></html>'
+CHECKIN_PAGE = '''<html><head><meta name="csrf-token" content="{token}"><title>Daily Check-in</title></head>
+<body><h1>Daily Check-in</h1><form method="post"><input type="hidden" name="_token" value="{token}"><button>签到</button></form></body></html>'''
+ALREADY_PAGE = '<html><head><title>Daily Check-in</title></head><body><h1>Daily Check-in</h1><p>今日已签到</p></body></html>'
+SUCCESS_PAGE = '<html><body><p>签到成功！获得奖励 0.5 元</p></body></html>'
+
+def make_certificate(host):
+    """Self-signed certificate for host; returns (cert_file, key_file)"""
+    directory = tempfile.mkdtemp(prefix='leaflow-stub-')
+    cert_file, key_file = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-keyout', key_file, '-out', cert_file, '-subj', f'/CN={host}',
+                    '-addext', f'subjectAltName=IP:{host}'],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert_file, key_file
+
+class _StubServer(ThreadingHTTPServer):
+    """HTTP/1.1 server that optionally speaks TLS and hands h2 connections to the stub"""
+    daemon_threads = True
+
+    def __init__(self, address, handler, stub, site, ssl_context=None):
+        super().__init__(address, handler)
+        self.stub = stub
+        self.site = site
+        self.ssl_context = ssl_context
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.ssl_context:
+            # Handshake on the connection's own thread, not the accept loop
+            sock = self.ssl_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+    def finish_request(self, request, client_address):
+        if self.ssl_context:
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError):
+                return
+            if request.selected_alpn_protocol() == 'h2':
+                return _H2Connection(self.stub, self.site, request).serve()
+        super().finish_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        pass  # clients closing keep-alive connections mid-benchmark are expected
+
+class _H2Connection:
+    """Server side of one h2 connection
+
+    Streams are answered on the stub's thread pool (so slow responses overlap),
+    but all socket I/O stays on the connection's thread: an SSL socket must not
+    be read and written from different threads at once.
+    """
+
+    def __init__(self, stub, site, sock):
+        self.stub = stub
+        self.site = site
+        self.sock = sock
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.streams = {}  # stream id -> (headers, body)
+        self.ready = queue.SimpleQueue()  # (stream id, status, headers, data) from the thread pool
+        self.blocked = []  # responses waiting for flow-control window
+        self.wake_r, self.wake_w = socket.socketpair()
+
+    def serve(self):
+        self.conn.initiate_connection()
+        try:
+            self.sock.sendall(self.conn.data_to_send())
+            while True:
+                if not self.sock.pending():
+                    readable, _, _ = select.select([self.sock, self.wake_r], [], [])
+                else:
+                    readable = [self.sock]
+                if self.wake_r in readable:
+                    self.wake_r.recv(4096)
+                    while not self.ready.empty():
+                        self.blocked.append(self.ready.get())
+                if self.sock in readable:
+                    data = self.sock.recv(65535)
+                    if not data:
+                        return
+                    if not self.receive(data):
+                        return
+                self.send_ready()
+                self.sock.sendall(self.conn.data_to_send())
+        except (OSError, h2.exceptions.ProtocolError):
+            pass
+        finally:
+            self.sock.close()
+            self.wake_r.close()
+            self.wake_w.close()
+
+    def receive(self, data):
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.streams.pop(event.stream_id)
+                self.stub.executor.submit(self.respond, event.stream_id, headers, bytes(body))
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                return False
+        return True
+
+    def respond(self, stream_id, headers, body):
+        status, response_headers, data = self.stub.dispatch(self.site, headers[':method'], headers[':path'],
+                                                            headers.get('cookie', ''), body)
+        self.ready.put((stream_id, status, response_headers, data))
+        try:
+            self.wake_w.send(b'x')
+        except OSError:
+            pass  # connection already closed
+
+    def send_ready(self):
+        blocked = []
+        for stream_id, status, headers, data in self.blocked:
+            if self.conn.local_flow_control_window(stream_id) < len(data):
+                blocked.append((stream_id, status, headers, data))
+                continue
+            self.conn.send_headers(stream_id, [(':status', str(status))] + [(k.lower(), v) for k, v in headers])
+            self.conn.send_data(stream_id, data, end_stream=True)
+        self.blocked = blocked
+
+class LeafLowStub:
+    """Two local HTTP servers standing in for leaflow.net and checkin.leaflow.net"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, already_rate=0.0, seed=None, host='127.0.0.1', tls=False):
+        self.tls = tls
+        self.ca_file = None
+        self.executor = None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.already_rate = already_rate
+        self.host = host
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.checked_in = {}  # session -> checked in today
+        self.requests = 0
+        self.errors = 0
+        self.servers = []
+
+    def _handler(self, site):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                stub.handle(self, site, 'GET')
+
+            def do_POST(self):
+                stub.handle(self, site, 'POST')
+
+        return Handler
+
+    @property
+    def scheme(self):
+        return 'https' if self.tls else 'http'
+
+    def start(self):
+        """Start both servers; returns (main_site_url, checkin_url)"""
+        ssl_context = None
+        if self.tls:
+            if h2 is None:
+                raise RuntimeError("--tls needs the h2 package: pip install 'httpx[http2]'")
+            self.ca_file, key_file = make_certificate(self.host)
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(self.ca_file, key_file)
+            ssl_context.set_alpn_protocols(['h2', 'http/1.1'])
+            self.executor = ThreadPoolExecutor(max_workers=256, thread_name_prefix='stub-h2')
+        urls = []
+        for site in ('main', 'checkin'):
+            server = _StubServer((self.host, 0), self._handler(site), self, site, ssl_context)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+            urls.append(f'{self.scheme}://{self.host}:{server.server_address[1]}')
+        return tuple(urls)
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def reset(self):
+        with self.lock:
+            self.checked_in.clear()
+            self.requests = 0
+            self.errors = 0
+
+    def _is_checked_in(self, session):
+        with self.lock:
+            if session not in self.checked_in:
+                self.checked_in[session] = self.random.random() < self.already_rate
+            return self.checked_in[session]
+
+    def _mark_checked_in(self, session):
+        with self.lock:
+            self.checked_in[session] = True
+
+    def handle(self, handler, site, method):
+        """Answer one HTTP/1.1 request"""
+        body = b''
+        length = int(handler.headers.get('Content-Length') or 0)
+        if length:
+            body = handler.rfile.read(length)
+        status, headers, data = self.dispatch(site, method, handler.path, handler.headers.get('Cookie', ''), body)
+        handler.send_response(status)
+        for name, value in headers:
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def dispatch(self, site, method, target, cookie_header, body):
+        """Route a request; returns (status, headers, body bytes)"""
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return self.respond(500, 'Internal Server Error')
+
+        cookies = SimpleCookie(cookie_header)
+        session = cookies['leaflow_session'].value if 'leaflow_session' in cookies else ''
+        path = urlsplit(target).path
+
+        if site == 'main':
+            if path == '/login':
+                return self.respond(200, LOGIN_PAGE)
+            if not session.startswith('valid'):
+                return self.redirect('/login')
+            if path in ('/dashboard', '/profile', '/user'):
+                return self.respond(200, DASHBOARD_PAGE)
+            return self.respond(404, 'Not Found')
+
+        # checkin.leaflow.net
+        if not session.startswith('valid'):
+            main_url = f'{self.scheme}://{self.host}:{self.servers[0].server_address[1]}/login'
+            return self.redirect(main_url)
+
+        token = hashlib.sha1(session.encode()).hexdigest()
+        if path == '/':
+            if method == 'GET':
+                if self._is_checked_in(session):
+                    return self.respond(200, ALREADY_PAGE)
+                return self.respond(200, CHECKIN_PAGE.format(token=token))
+            form = parse_qs(body.decode())
+            if form.get('_token', [''])[0] != token:
+                return self.respond(419, 'Page Expired')
+            self._mark_checked_in(session)
+            return self.respond(200, SUCCESS_PAGE)
+
+        if path in ('/api/checkin', '/checkin'):
+            if method == 'GET':
+                return self.respond(405, json.dumps({'message': 'Method not allowed'}), 'application/json')
+            self._mark_checked_in(session)
+            return self.respond(200, json.dumps({'success': True, 'message': 'checkin successful'}), 'application/json')
+
+        return self.respond(404, 'Not Found')
+
+    def respond(self, status, text, content_type='text/html; charset=utf-8'):
+        data = text.encode('utf-8')
+        return status, [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(data))),
+            ('Set-Cookie', 'XSRF-TOKEN=' + hashlib.md5(str(time.time()).encode()).hexdigest() + '; Path=/'),
+        ], data
+
+    def redirect(self, location):
+        return 302, [('Location', location), ('Content-Length', '0')], b''
+
+def main():
+    parser = argparse.ArgumentParser(description='Local LeafLow stand-in server')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added latency per request')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with 500')
+    parser.add_argument('--already-rate', type=float, default=0, help='Fraction of sessions already checked in')
+    parser.add_argument('--tls', action='store_true', help='Serve HTTPS and negotiate h2 or http/1.1 via ALPN')
+    args = parser.parse_args()
+
+    stub = LeafLowStub(args.latency_ms / 1000, args.error_rate, args.already_rate, tls=args.tls)
+    main_site, checkin_url = stub.start()
+    if stub.ca_file:
+        print(f"REQUESTS_CA_BUNDLE={stub.ca_file}")
+        print(f"SSL_CERT_FILE={stub.ca_file}")
+    print(f"LEAFLOW_MAIN_SITE={main_site}")
+    print(f"LEAFLOW_CHECKIN_URL={checkin_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == '__main__':
+    main()
@@ -13,28 +13,153 @@ LeafLow Token-Based Check-in Script
 5. 运行此脚本进行自动签到
 """
 
+import os
 import json
 import time
 import sys
 import logging
+import tempfile
 import argparse
+import queue
+import threading
+import heapq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from datetime import datetime
+import metrics
+import log_setup
+import http_transport
+
+# 可通过环境变量指向测试/基准用的替身服务器
+CHECKIN_URL = os.getenv('LEAFLOW_CHECKIN_URL', "https://checkin.leaflow.net")
+MAIN_SITE = os.getenv('LEAFLOW_MAIN_SITE', "https://leaflow.net")
+
+# NDJSON账号文件（每行一个账号）没有settings时使用的默认设置
+DEFAULT_SETTINGS = {
+    'log_level': 'INFO',
+    'retry_delay': 3,
+    'timeout': 30,
+    'connect_timeout': 10,
+    'account_deadline': 120,
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+}
+# 流式读取账号时预读的账号数
+ACCOUNT_LOOKAHEAD = int(os.getenv('LEAFLOW_ACCOUNT_LOOKAHEAD', '64'))
+# 结果通知中逐条列出的账号数上限，其余只计数
+NOTIFY_MAX_ACCOUNTS = 100
+
+def is_ndjson(path):
+    return path.endswith(('.ndjson', '.jsonl'))
+
+def prefetch(iterable, size):
+    """后台线程预读iterable，最多缓存size个元素"""
+    buffer = queue.Queue(maxsize=max(1, size))
+    done = object()
+    stop = threading.Event()
+    
+    def producer():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(done)
+    
+    threading.Thread(target=producer, name='account-prefetch', daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+class ResultSpool:
+    """签到结果按顺序暂存到临时文件（每行一个JSON），内存中只保留计数；可重复迭代"""
+    def __init__(self):
+        self.file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.success_count = 0
+        self.total_count = 0
+        self.cookies_refreshed = 0
+    
+    def append(self, result):
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.total_count += 1
+        self.success_count += 1 if result['success'] else 0
+        self.cookies_refreshed += 1 if result['stats'].get('cookies_refreshed') else 0
+    
+    def __len__(self):
+        return self.total_count
+    
+    def __iter__(self):
+        self.file.flush()
+        self.file.seek(0)
+        for line in self.file:
+            yield json.loads(line)
+    
+    def close(self):
+        self.file.close()
+
+class DeadlineExceeded(Exception):
+    pass
+
+class Deadline:
+    """截止时间（seconds为0/None表示不限），可再受parent的截止时间约束；label记录实际生效的是哪个截止时间"""
+    def __init__(self, seconds=None, parent=None, name='Deadline'):
+        self.at = time.monotonic() + seconds if seconds else None
+        self.label = f"{name} exceeded ({seconds}s budget)"
+        if parent is not None and parent.at is not None and (self.at is None or parent.at < self.at):
+            self.at = parent.at
+            self.label = parent.label
+    
+    def remaining(self):
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+    
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
 
 class LeafLowTokenCheckin:
-    def __init__(self, config_file="config.accounts.json"):
-        """初始化Token签到类"""
+    def __init__(self, config_file="config.accounts.json", config=None):
+        """初始化Token签到类（传入config字典时不读取配置文件）"""
         self.config_file = config_file
-        self.config = self.load_config()
+        # NDJSON账号文件按行流式读取，self.config['accounts']为None
+        self.streaming = config is None and is_ndjson(config_file)
+        # 流式模式下cookie被刷新的账号按顺序暂存到临时文件（序号\t账号JSON），内存占用不随账号数增长
+        self.refreshed_spool = None
+        self.config = config if config is not None else self.load_config()
         self.setup_logging()
-        self.checkin_url = "https://checkin.leaflow.net"
-        self.main_site = "https://leaflow.net"
+        self.checkin_url = CHECKIN_URL
+        self.main_site = MAIN_SITE
+        settings = self.config['settings']
+        self.read_timeout = settings.get('timeout', 30)
+        self.connect_timeout = settings.get('connect_timeout', min(10, self.read_timeout))
+        self.account_deadline = settings.get('account_deadline', 120)
         
     def load_config(self):
-        """加载配置文件"""
+        """加载配置文件（NDJSON文件只读取可选的settings首行）"""
         try:
             with open(self.config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                if not self.streaming:
+                    return json.load(f)
+                settings = dict(DEFAULT_SETTINGS)
+                for line in f:
+                    if line.strip():
+                        first = json.loads(line)
+                        settings.update(first.get('settings', {}) if isinstance(first, dict) else {})
+                        break
+                return {'settings': settings, 'accounts': None}
         except FileNotFoundError:
             print(f"Configuration file {self.config_file} not found")
             sys.exit(1)
@@ -42,22 +167,77 @@ class LeafLowTokenCheckin:
             print(f"Configuration file {self.config_file} format error")
             sys.exit(1)
     
+    def iter_accounts(self):
+        """逐个产生账号；NDJSON文件按行惰性读取，跳过空行、settings行和无法解析的行"""
+        if not self.streaming:
+            yield from self.config['accounts']
+            return
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                account = self._parse_account_line(line, line_number)
+                if account is not None:
+                    yield account
+    
+    def _parse_account_line(self, line, line_number):
+        if not line.strip():
+            return None
+        try:
+            account = json.loads(line)
+        except json.JSONDecodeError:
+            self.logger.warning(f"⚠️ {self.config_file}:{line_number} is not valid JSON, skipped")
+            return None
+        if not isinstance(account, dict) or 'settings' in account:
+            return None
+        return account
+    
+    def save_config(self):
+        """原子地写回配置文件（先写临时文件再替换）"""
+        directory = os.path.dirname(os.path.abspath(self.config_file))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.config.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                if self.streaming:
+                    self._rewrite_ndjson(f)
+                else:
+                    json.dump(self.config, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.config_file)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+    
+    def _rewrite_ndjson(self, out):
+        """逐行复制NDJSON文件，替换cookie被刷新的账号"""
+        refreshed = iter(())
+        if self.refreshed_spool is not None:
+            self.refreshed_spool.seek(0)
+            refreshed = (entry.rstrip('\n').split('\t', 1) for entry in self.refreshed_spool)
+        next_refreshed = next(refreshed, None)
+        
+        account_index = 0
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                account = self._parse_account_line(line, line_number)
+                if account is not None:
+                    if next_refreshed is not None and int(next_refreshed[0]) == account_index:
+                        line = next_refreshed[1] + '\n'
+                        next_refreshed = next(refreshed, None)
+                    account_index += 1
+                out.write(line)
+    
     def setup_logging(self):
         """设置日志"""
         log_level = getattr(logging, self.config['settings'].get('log_level', 'INFO').upper())
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('leaflow_token_checkin.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # 每个进程只配置一次（控制面板中已由app.py配置）
+        log_setup.setup_logging('leaflow_token_checkin.log', log_level)
         self.logger = logging.getLogger(__name__)
     
     def create_session(self, token_data):
         """根据token数据创建会话"""
         session = requests.Session()
+        adapter = http_transport.make_adapter()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.checkin_stats = adapter.stats
         
         # 设置基本headers
         session.headers.update({
@@ -82,8 +262,27 @@ class LeafLowTokenCheckin:
         
         return session
     
-    def test_authentication(self, session, account_name):
-        """测试认证是否有效"""
+    def request_timeout(self, deadline=None):
+        """requests的(连接, 读取)超时，不超过deadline剩余时间；已到期时抛出DeadlineExceeded"""
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is None:
+            return self.connect_timeout, self.read_timeout
+        if remaining <= 0:
+            raise DeadlineExceeded(deadline.label)
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+    
+    def refreshed_cookies(self, session, token_data):
+        """返回服务器通过Set-Cookie轮换后的cookies，没有变化时返回None"""
+        stored = token_data.get('cookies') or {}
+        updated = dict(stored)
+        for cookie in session.cookies:
+            # 只更新已保存的cookie；domain为空的是create_session放入的原值
+            if cookie.name in stored and cookie.domain and cookie.value != stored[cookie.name]:
+                updated[cookie.name] = cookie.value
+        return updated if updated != stored else None
+    
+    def test_authentication(self, session, account_name, deadline=None):
+        """测试认证是否有效（deadline到期后不再尝试剩余的页面）"""
         try:
             # 尝试访问需要认证的页面
             test_urls = [
@@ -94,7 +293,7 @@ class LeafLowTokenCheckin:
             ]
             
             for url in test_urls:
-                response = session.get(url, timeout=30)
+                response = session.get(url, timeout=self.request_timeout(deadline))
                 self.logger.debug(f"[{account_name}] Test {url}: {response.status_code}")
                 
                 if response.status_code == 200:
@@ -110,19 +309,21 @@ class LeafLowTokenCheckin:
             
             return False, "Authentication failed - no valid authenticated pages found"
             
+        except DeadlineExceeded as e:
+            return False, str(e)
         except Exception as e:
             return False, f"Authentication test error: {str(e)}"
     
-    def perform_checkin(self, session, account_name):
-        """执行签到操作"""
+    def perform_checkin(self, session, account_name, deadline=None):
+        """执行签到操作（deadline到期后不再尝试剩余的签到方式）"""
         self.logger.info(f"🎯 [{account_name}] Performing checkin...")
         
         try:
             # 方法1: 直接访问签到页面
-            response = session.get(self.checkin_url, timeout=30)
+            response = session.get(self.checkin_url, timeout=self.request_timeout(deadline))
             
             if response.status_code == 200:
-                result = self.analyze_and_checkin(session, response.text, self.checkin_url, account_name)
+                result = self.analyze_and_checkin(session, response.text, self.checkin_url, account_name, deadline)
                 if result[0]:
                     return result
             
@@ -137,29 +338,35 @@ class LeafLowTokenCheckin:
             for endpoint in api_endpoints:
                 try:
                     # GET请求
-                    response = session.get(endpoint, timeout=30)
+                    metrics.checkin_retries.inc()
+                    response = session.get(endpoint, timeout=self.request_timeout(deadline))
                     if response.status_code == 200:
                         success, message = self.check_checkin_response(response.text)
                         if success:
                             return True, message
                     
                     # POST请求
-                    response = session.post(endpoint, data={'checkin': '1'}, timeout=30)
+                    metrics.checkin_retries.inc()
+                    response = session.post(endpoint, data={'checkin': '1'}, timeout=self.request_timeout(deadline))
                     if response.status_code == 200:
                         success, message = self.check_checkin_response(response.text)
                         if success:
                             return True, message
                             
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     self.logger.debug(f"[{account_name}] API endpoint {endpoint} failed: {str(e)}")
                     continue
             
             return False, "All checkin methods failed"
             
+        except DeadlineExceeded as e:
+            return False, str(e)
         except Exception as e:
             return False, f"Checkin error: {str(e)}"
     
-    def analyze_and_checkin(self, session, html_content, page_url, account_name):
+    def analyze_and_checkin(self, session, html_content, page_url, account_name, deadline=None):
         """分析页面内容并执行签到"""
         # 检查是否已经签到
         if self.already_checked_in(html_content):
@@ -179,11 +386,13 @@ class LeafLowTokenCheckin:
                 checkin_data['_token'] = csrf_token
                 checkin_data['csrf_token'] = csrf_token
             
-            response = session.post(page_url, data=checkin_data, timeout=30)
+            response = session.post(page_url, data=checkin_data, timeout=self.request_timeout(deadline))
             
             if response.status_code == 200:
                 return self.check_checkin_response(response.text)
                 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.debug(f"[{account_name}] POST checkin failed: {str(e)}")
         
@@ -249,118 +458,275 @@ class LeafLowTokenCheckin:
         
         return False, "Checkin response indicates failure"
     
-    def perform_token_checkin(self, account_data, account_name):
-        """使用token执行签到"""
+    def perform_token_checkin(self, account_data, account_name, stats=None, batch_deadline=None):
+        """使用token执行签到
+
+        传入stats字典时写入本次运行的统计：各阶段耗时(毫秒)、HTTP请求数、
+        下载字节数以及签到成功的端点
+        整个账号（认证+签到）不超过settings中的account_deadline秒，也不超过batch_deadline
+        """
+        if stats is None:
+            stats = {}
+        deadline = Deadline(self.account_deadline, batch_deadline, 'Account deadline')
         if 'token_data' not in account_data:
             return False, "No token data found in account configuration"
         
+        session = None
         try:
+            start = time.perf_counter()
             session = self.create_session(account_data['token_data'])
+            stats['session_ms'] = int((time.perf_counter() - start) * 1000)
             
             # 测试认证
-            auth_result = self.test_authentication(session, account_name)
+            start = time.perf_counter()
+            auth_result = self.test_authentication(session, account_name, deadline)
+            elapsed = time.perf_counter() - start
+            stats['auth_ms'] = int(elapsed * 1000)
+            metrics.auth_probe_seconds.observe(elapsed, result='success' if auth_result[0] else 'failure')
             if not auth_result[0]:
+                if deadline.expired():
+                    # 被截止时间截断的请求报超时，改为报告到期的是哪个截止时间
+                    stats['deadline_exceeded'] = True
+                    metrics.checkin_deadline_exceeded.inc()
+                    return False, f"Authentication failed: {deadline.label}"
                 return False, f"Authentication failed: {auth_result[1]}"
             
             # 执行签到
-            return self.perform_checkin(session, account_name)
+            start = time.perf_counter()
+            result = self.perform_checkin(session, account_name, deadline)
+            elapsed = time.perf_counter() - start
+            stats['checkin_ms'] = int(elapsed * 1000)
+            metrics.checkin_seconds.observe(elapsed, result='success' if result[0] else 'failure')
+            if result[0]:
+                stats['endpoint'] = session.checkin_stats['last_endpoint']
+            elif deadline.expired():
+                stats['deadline_exceeded'] = True
+                metrics.checkin_deadline_exceeded.inc()
+                return False, deadline.label
+            return result
             
         except Exception as e:
             return False, f"Token checkin error: {str(e)}"
+        finally:
+            if session is not None:
+                stats['http_requests'] = session.checkin_stats['http_requests']
+                stats['bytes_downloaded'] = session.checkin_stats['bytes_downloaded']
+                
+                # 保存轮换后的cookies，调用方根据 cookies_refreshed 决定是否持久化
+                cookies = self.refreshed_cookies(session, account_data['token_data'])
+                if cookies:
+                    account_data['token_data'] = {**account_data['token_data'], 'cookies': cookies}
+                    stats['cookies_refreshed'] = True
     
-    def run_all_accounts(self):
-        """为所有账号执行token签到"""
+    def checkin_account(self, account_index, account, delay=0, batch_deadline=None):
+        """签到单个账号，返回结果字典（delay为开始前等待的秒数，batch_deadline到期后不再开始）"""
+        expired = lambda: batch_deadline is not None and batch_deadline.expired()
+        if delay and not expired():
+            self.logger.info(f"⏱️ Waiting {delay} seconds before next account...")
+            # 等待不超过整批截止时间的剩余时间
+            remaining = batch_deadline.remaining() if batch_deadline is not None else None
+            time.sleep(delay if remaining is None else min(delay, remaining))
+        
+        account_name = f"账号{account_index + 1}"
+        stats = {}
+        if expired():
+            self.logger.warning(f"⌛ [{account_name}] Batch deadline exceeded, not started")
+            stats['deadline_exceeded'] = True
+            return {
+                'index': account_index,
+                'account': account_name,
+                'success': False,
+                'message': "Batch deadline exceeded",
+                'stats': stats,
+            }
+        self.logger.info(f"\n📋 正在处理 {account_name}...")
+        
+        success, message = self.perform_token_checkin(account, account_name, stats, batch_deadline)
+        if success:
+            self.logger.info(f"✅ [{account_name}] {message}")
+        else:
+            self.logger.error(f"❌ [{account_name}] {message}")
+        return {
+            'index': account_index,
+            'account': account_name,
+            'success': success,
+            'message': message,
+            'stats': stats,
+        }
+    
+    def run_all_accounts(self, workers=1, shard=None, deadline=None):
+        """为所有账号执行token签到
+        
+        workers: 并发签到的线程数
+        shard: (i, n) 只处理序号 % n == i - 1 的账号，用于把账号分给多个任务
+        deadline: 整批的时间上限（秒），到期后进行中的账号在下一个请求前停止，未开始的账号记为失败
+        """
+        batch_deadline = Deadline(deadline, name='Batch deadline') if deadline else None
         self.logger.info("=" * 60)
         self.logger.info("🔑 LeafLow Token-Based Auto Check-in Started")
         self.logger.info("=" * 60)
-        success_count = 0
-        total_count = 0
-        results = []
+        results = ResultSpool()
+        delay = self.config['settings'].get('retry_delay', 5)
+        
+        def record(result, account):
+            results.append(result)
+            if self.streaming and result['stats'].get('cookies_refreshed'):
+                if self.refreshed_spool is None:
+                    self.refreshed_spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+                self.refreshed_spool.write(f"{result['index']}\t{json.dumps(account, ensure_ascii=False)}\n")
         
-        for account_index, account in enumerate(self.config['accounts']):
-            if not account.get('enabled', True):
-                self.logger.info(f"⏭️ Skipping disabled account: Account{account_index+1}")
-                continue
+        # 按顺序处理完成的结果（临时文件要求序号递增），同时最多 workers*2 个账号在途
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            started = 0
+            for account_index, account in enumerate(prefetch(self.iter_accounts(), ACCOUNT_LOOKAHEAD)):
+                if shard and account_index % shard[1] != shard[0] - 1:
+                    continue
+                if not account.get('enabled', True):
+                    self.logger.info(f"⏭️ Skipping disabled account: Account{account_index+1}")
+                    continue
                 
-            total_count += 1
-            account_name = f"账号{account_index + 1}"
-            self.logger.info(f"\n📋 正在处理 {account_name}...")
-            
-            success, message = self.perform_token_checkin(account, account_name)
-            results.append({
-                'account': account_name,
-                'success': success,
-                'message': message,
-            })
-            
-            if success:
-                self.logger.info(f"✅ [{account_name}] {message}")
-                success_count += 1
-            else:
-                self.logger.error(f"❌ [{account_name}] {message}")
-            
-            # 账号间延迟
-            if account_index < len(self.config['accounts']) - 1:
-                delay = self.config['settings'].get('retry_delay', 5)
-                self.logger.info(f"⏱️ Waiting {delay} seconds before next account...")
-                time.sleep(delay)
+                # 账号间延迟：每个线程在处理下一个账号前等待
+                future = executor.submit(self.checkin_account, account_index, account,
+                                         delay if started >= workers else 0, batch_deadline)
+                pending.append((future, account))
+                started += 1
+                while len(pending) >= max(1, workers) * 2 or (workers <= 1 and pending):
+                    future, account = pending.popleft()
+                    record(future.result(), account)
+            while pending:
+                future, account = pending.popleft()
+                record(future.result(), account)
         
+        success_count, total_count = results.success_count, results.total_count
         self.logger.info("\n" + "=" * 60)
         self.logger.info(f"🏁 Token check-in completed: {success_count}/{total_count} successful")
         self.logger.info("=" * 60)
         
         return success_count, total_count, results
 
+def parse_shard(value):
+    """解析 --shard i/N (i 从1开始)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected i/N")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', i must be between 1 and N")
+    return index, count
+
+def write_results(path, success_count, total_count, results, shard=None):
+    """保存签到结果，供 --merge 合并（逐条写出，结果不需要全部在内存中）"""
+    header = {
+        'shard': f"{shard[0]}/{shard[1]}" if shard else None,
+        'success_count': success_count,
+        'total_count': total_count,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "results": [')
+        for i, result in enumerate(results):
+            f.write((',\n' if i else '\n') + json.dumps(result, ensure_ascii=False))
+        f.write('\n]}\n')
+
+def merge_results(paths):
+    """合并多个分片的结果文件，返回 (success_count, total_count, results)
+
+    每次只载入一个文件，各分片的结果已按序号排列，归并后写入ResultSpool
+    """
+    spools = []
+    for path in paths:
+        spool = ResultSpool()
+        with open(path, 'r', encoding='utf-8') as f:
+            for result in json.load(f)['results']:
+                spool.append(result)
+        spools.append(spool)
+    results = ResultSpool()
+    for result in heapq.merge(*spools, key=lambda result: result.get('index', 0)):
+        results.append(result)
+    for spool in spools:
+        spool.close()
+    return results.success_count, results.total_count, results
+
+def send_results_notification(success_count, total_count, results, logger):
+    """发送签到结果通知"""
+    try:
+        from notify import send
+        
+        # Load notification config if exists
+        notify_config = {}
+        if os.path.exists('config.notify.json'):
+            with open('config.notify.json', 'r', encoding='utf-8') as f:
+                notify_config = json.load(f)
+        
+        # 构建通知内容
+        title = "LeafLow Token-Based Auto Check-in Results"
+        content_lines = [f"Token check-in completed: {success_count}/{total_count} successful\n"]
+        
+        for i, result in enumerate(results):
+            if i == NOTIFY_MAX_ACCOUNTS:
+                content_lines.append(f"... and {total_count - NOTIFY_MAX_ACCOUNTS} more accounts")
+                break
+            status = "✅" if result['success'] else "❌"
+            content_lines.append(f"{status} {result['account']}: {result['message']}")
+        
+        content = "\n".join(content_lines)
+        send(title, content, **notify_config)
+        logger.info("📱 Notification sent")
+        
+    except ImportError:
+        logger.warning("⚠️ Notify module not found, skipping notification")
+    except Exception as e:
+        logger.error(f"❌ Failed to send notification: {str(e)}")
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='LeafLow Token-Based Auto Check-in Script')
-    parser.add_argument('--config', default='config.accounts.json', help='Configuration file path')
+    parser.add_argument('--config', default='config.accounts.json', help='Configuration file path (.ndjson/.jsonl: one account per line, read lazily)')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--notify', action='store_true', help='Enable notification push')
     parser.add_argument('--no-notify', action='store_true', help='Disable notification push')
+    parser.add_argument('--save-cookies', action='store_true', help='Write refreshed cookies back to the configuration file')
+    parser.add_argument('--record', metavar='ARCHIVE', help='Record HTTP exchanges to an archive (.jsonl.gz)')
+    parser.add_argument('--replay', metavar='ARCHIVE', help='Replay HTTP exchanges from an archive instead of the network')
+    parser.add_argument('--workers', type=int, default=1, help='Accounts checked in concurrently')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help='Only process shard i of N (accounts split by position)')
+    parser.add_argument('--results-out', metavar='FILE', help='Write results as JSON (input for --merge)')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS', help='Stop the whole run after SECONDS; unfinished accounts are reported as failed')
+    parser.add_argument('--merge', nargs='+', metavar='FILE', help='Merge shard result files into one summary and notification instead of checking in')
     
     args = parser.parse_args()
     
+    if args.record or args.replay:
+        http_transport.configure(record=args.record, replay=args.replay)
+    
     try:
-        checkin = LeafLowTokenCheckin(args.config)
-        
-        if args.debug:
-            import logging
-            logging.getLogger().setLevel(logging.DEBUG)
-            checkin.logger.info("🐛 Debug mode enabled")
+        if args.merge:
+            log_setup.setup_logging('leaflow_token_checkin.log')
+            logger = logging.getLogger(__name__)
+            success_count, total_count, results = merge_results(args.merge)
+            logger.info(f"🏁 Merged {len(args.merge)} result files: {success_count}/{total_count} successful")
+        else:
+            checkin = LeafLowTokenCheckin(args.config)
+            logger = checkin.logger
+            
+            if args.debug:
+                logging.getLogger().setLevel(logging.DEBUG)
+                logger.info("🐛 Debug mode enabled")
+            
+            # 执行签到
+            success_count, total_count, results = checkin.run_all_accounts(
+                workers=args.workers, shard=args.shard, deadline=args.deadline)
+            
+            if args.save_cookies and results.cookies_refreshed:
+                checkin.save_config()
+                logger.info(f"🍪 Refreshed cookies saved to {args.config}")
         
-        # 执行签到
-        success_count, total_count, results = checkin.run_all_accounts()
+        if args.results_out:
+            write_results(args.results_out, success_count, total_count, results, args.shard)
         
         # 通知逻辑
         if args.notify or (not args.no_notify):
-            try:
-                from notify import send
-                import os
-                import json
-                
-                # Load notification config if exists
-                notify_config = {}
-                if os.path.exists('config.notify.json'):
-                    with open('config.notify.json', 'r', encoding='utf-8') as f:
-                        notify_config = json.load(f)
-                
-                # 构建通知内容
-                title = "LeafLow Token-Based Auto Check-in Results"
-                content_lines = [f"Token check-in completed: {success_count}/{total_count} successful\n"]
-                
-                for result in results:
-                    status = "✅" if result['success'] else "❌"
-                    content_lines.append(f"{status} {result['account']}: {result['message']}")
-                
-                content = "\n".join(content_lines)
-                send(title, content, **notify_config)
-                checkin.logger.info("📱 Notification sent")
-                
-            except ImportError:
-                checkin.logger.warning("⚠️ Notify module not found, skipping notification")
-            except Exception as e:
-                checkin.logger.error(f"❌ Failed to send notification: {str(e)}")
+            send_results_notification(success_count, total_count, results, logger)
         
     except KeyboardInterrupt:
         print("\n\n⏸️ User interrupted program")
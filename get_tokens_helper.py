@@ -8,15 +8,31 @@ and saves them in the required JSON format for the check-in script.
 
 Usage:
     python get_tokens_helper.py
+    python get_tokens_helper.py --batch cookies.txt --validate --merge
+    cat cookies.txt | python get_tokens_helper.py --batch - --output accounts.ndjson
     
 For GitHub Actions: Set LEAFLOW_COOKIES environment variable
 For local testing: Use the hardcoded cookie string in this file
+For many accounts: --batch reads one cookie string per line
 """
 
+import argparse
 import json
 import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote
 
+DEFAULT_SETTINGS = {
+    "log_level": "INFO",
+    "retry_delay": 3,
+    "timeout": 30,
+    "connect_timeout": 10,
+    "account_deadline": 120,
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+}
+
 def parse_cookie_string(cookie_string):
     """
     Parse a cookie string into a dictionary.
@@ -50,12 +66,7 @@ def create_config_from_cookies(cookies):
         Configuration dictionary
     """
     config = {
-        "settings": {
-            "log_level": "INFO",
-            "retry_delay": 3,
-            "timeout": 30,
-            "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-        },
+        "settings": dict(DEFAULT_SETTINGS),
         "accounts": [
             {
                 "token_data": {
@@ -67,10 +78,221 @@ def create_config_from_cookies(cookies):
     
     return config
 
+def account_key(cookies):
+    """
+    Identify an account for de-duplication.
+    
+    Args:
+        cookies: Dictionary of cookie name-value pairs
+        
+    Returns:
+        The leaflow_session value, or all cookies when it is missing
+    """
+    if cookies.get('leaflow_session'):
+        return cookies['leaflow_session']
+    return json.dumps(cookies, sort_keys=True)
+
+def read_cookie_lines(source):
+    """
+    Read cookie strings, one per line, skipping blank lines and # comments.
+    
+    Args:
+        source: File path, or "-" for stdin
+        
+    Yields:
+        (line number, cookie string) tuples
+    """
+    f = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line_number, line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def parse_batch(lines, existing_keys=()):
+    """
+    Parse and de-duplicate cookie strings.
+    
+    Args:
+        lines: Iterable of (line number, cookie string)
+        existing_keys: Account keys already in the output file
+        
+    Returns:
+        (accounts, invalid) where accounts is a list of (line number, cookies)
+        and invalid a list of (line number, reason)
+    """
+    seen = set(existing_keys)
+    accounts, invalid = [], []
+    for line_number, line in lines:
+        cookies = parse_cookie_string(line)
+        if not cookies:
+            invalid.append((line_number, "no cookies found"))
+            continue
+        if 'leaflow_session' not in cookies:
+            invalid.append((line_number, "missing leaflow_session cookie"))
+            continue
+        key = account_key(cookies)
+        if key in seen:
+            invalid.append((line_number, "duplicate account"))
+            continue
+        seen.add(key)
+        accounts.append((line_number, cookies))
+    return accounts, invalid
+
+def validate_accounts(accounts, workers=8):
+    """
+    Probe each account's authentication in parallel.
+    
+    Args:
+        accounts: List of (line number, cookies)
+        workers: Concurrent probes
+        
+    Returns:
+        (valid accounts, invalid list of (line number, reason))
+    """
+    from checkin_token import LeafLowTokenCheckin
+    
+    checkin = LeafLowTokenCheckin(config={'settings': dict(DEFAULT_SETTINGS), 'accounts': []})
+    
+    def probe(entry):
+        line_number, cookies = entry
+        try:
+            session = checkin.create_session({'cookies': cookies})
+            return checkin.test_authentication(session, f"line {line_number}")
+        except Exception as e:
+            return False, str(e)
+    
+    valid, invalid = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for entry, (ok, message) in zip(accounts, executor.map(probe, accounts)):
+            if ok:
+                valid.append(entry)
+            else:
+                invalid.append((entry[0], message))
+    return valid, invalid
+
+def parse_ndjson_lines(output_file, lines):
+    """
+    Yield the JSON objects of an NDJSON file, skipping blank and malformed lines.
+    
+    Args:
+        output_file: File name used in the warning for a malformed line
+        lines: Iterable of the file's lines
+        
+    Yields:
+        Parsed JSON value of each valid line
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            print(f"⚠️ {output_file}:{line_number} is not valid JSON, skipped")
+
+def existing_account_keys(output_file):
+    """
+    Keys of the accounts already saved in a JSON or NDJSON config file.
+    """
+    keys = set()
+    if not os.path.exists(output_file):
+        return keys
+    with open(output_file, 'r', encoding='utf-8') as f:
+        if output_file.endswith(('.ndjson', '.jsonl')):
+            accounts = parse_ndjson_lines(output_file, f)
+        else:
+            accounts = json.load(f).get('accounts', [])
+        for account in accounts:
+            cookies = account.get('token_data', {}).get('cookies') if isinstance(account, dict) else None
+            if cookies:
+                keys.add(account_key(cookies))
+    return keys
+
+def write_accounts(output_file, accounts, merge=False):
+    """
+    Write accounts to a JSON config or NDJSON file in one atomic replace.
+    
+    Args:
+        output_file: config.accounts.json style file, or .ndjson/.jsonl (one account per line)
+        accounts: List of cookie dictionaries
+        merge: Keep the accounts already in output_file
+    """
+    new_accounts = [{"token_data": {"cookies": cookies}} for cookies in accounts]
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.config.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            if output_file.endswith(('.ndjson', '.jsonl')):
+                # Existing lines are copied as-is, new accounts appended
+                if merge and os.path.exists(output_file):
+                    with open(output_file, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            out.write(line if line.endswith('\n') else line + '\n')
+                for account in new_accounts:
+                    out.write(json.dumps(account, ensure_ascii=False) + '\n')
+            else:
+                config = {"settings": dict(DEFAULT_SETTINGS), "accounts": []}
+                if merge and os.path.exists(output_file):
+                    with open(output_file, 'r', encoding='utf-8') as f:
+                        config = json.load(f)
+                config.setdefault('accounts', []).extend(new_accounts)
+                json.dump(config, out, indent=2, ensure_ascii=False)
+        os.replace(temp_path, output_file)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+def run_batch(args):
+    """
+    Batch mode: many cookie strings in, one config file out.
+    """
+    existing_keys = existing_account_keys(args.output) if args.merge else set()
+    print(f"📝 Reading cookie strings from {'stdin' if args.batch == '-' else args.batch}...")
+    accounts, invalid = parse_batch(read_cookie_lines(args.batch), existing_keys)
+    print(f"✅ Parsed {len(accounts)} new accounts")
+    
+    if args.validate and accounts:
+        print(f"🔍 Validating {len(accounts)} accounts ({args.workers} in parallel)...")
+        accounts, failed = validate_accounts(accounts, args.workers)
+        invalid.extend(failed)
+        print(f"✅ {len(accounts)} accounts authenticated")
+    
+    if invalid:
+        print(f"\n⚠️ {len(invalid)} invalid entries:")
+        for line_number, reason in sorted(invalid):
+            print(f"  - line {line_number}: {reason}")
+    
+    if not accounts:
+        print(f"\n❌ No valid accounts, {args.output} left unchanged")
+        return not invalid
+    if invalid and not args.merge and os.path.exists(args.output):
+        # A partial batch would replace every account already in the file
+        print(f"\n❌ Not replacing {args.output} with a batch that has invalid entries; fix them or use --merge")
+        return False
+    
+    print(f"\n💾 {'Merging' if args.merge else 'Saving'} {len(accounts)} accounts into {args.output}...")
+    write_accounts(args.output, [cookies for _, cookies in accounts], merge=args.merge)
+    print(f"✅ Configuration saved successfully!")
+    
+    return not invalid or bool(accounts)
+
 def main():
     """
     Main function to extract tokens and create config file.
     """
+    parser = argparse.ArgumentParser(description='LeafLow cookie to config helper')
+    parser.add_argument('--batch', metavar='FILE', help='Read one cookie string per line from FILE ("-" for stdin)')
+    parser.add_argument('--output', default='config.accounts.json', help='Config file to write (.ndjson/.jsonl: one account per line)')
+    parser.add_argument('--merge', action='store_true', help='Add to the accounts already in the output file instead of replacing them')
+    parser.add_argument('--validate', action='store_true', help='Probe each account\'s authentication before saving it')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel authentication probes for --validate')
+    args = parser.parse_args()
+    
+    if args.batch:
+        return run_batch(args)
     
     # For GitHub Actions: Read from environment variable
     cookie_string = os.environ.get('LEAFLOW_COOKIES', '')
@@ -98,15 +320,11 @@ def main():
         value_preview = cookies[name][:20] + "..." if len(cookies[name]) > 20 else cookies[name]
         print(f"  - {name}: {value_preview}")
     
-    # Create configuration
-    config = create_config_from_cookies(cookies)
-    
     # Save to file
-    output_file = "config.accounts.json"
+    output_file = args.output
     print(f"\n💾 Saving configuration to {output_file}...")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    write_accounts(output_file, [cookies], merge=args.merge)
     
     print(f"✅ Configuration saved successfully!")
     print(f"📄 You can now run: python checkin_token.py")
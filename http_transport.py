@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP transport for LeafLow check-in sessions
+签到会话使用的HTTP传输层
+
+- InstrumentedAdapter: 记录请求次数、延迟、错误和下载字节数
+- RecordingAdapter:    真实请求并把请求/响应写入归档 (gzip压缩的JSON Lines)
+- ReplayAdapter:       离线从归档回放响应，不访问网络
+- Http2Adapter:        通过httpx的HTTP/2客户端发送，多个账号的请求复用少量连接
+
+通过环境变量 LEAFLOW_HTTP_RECORD / LEAFLOW_HTTP_REPLAY (归档路径) 或
+configure() 选择模式
+
+直连模式下所有会话共用一个连接池 (LEAFLOW_SHARED_POOL=0 关闭)，
+cookie仍然按会话隔离；warm_up() 可以提前建立keep-alive连接
+
+LEAFLOW_HTTP2=1 启用HTTP/2 (需要 pip install 'httpx[http2]')，未安装或
+连接失败时回退到requests。实验性：本地h2基准 (bench_checkin.py --tls --http2)
+中不比requests的HTTP/1.1+TLS快，不作为性能选项。同步的httpx客户端不是
+线程安全的，每个线程使用自己的客户端
+"""
+
+import base64
+import gzip
+import http.client
+import http.cookiejar
+import logging
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import metrics
+
+try:
+    import httpx  # optional: HTTP/2 backend
+except ImportError:
+    httpx = None
+
+# 归档中不保存的请求头（凭据）
+REDACTED_HEADERS = ('cookie', 'authorization')
+# 归档中遮盖值的表单字段，以及响应Set-Cookie的值使用的占位符（cookie值中合法的字符）
+REDACTED_FIELDS = ('_token', 'csrf_token', 'token', 'password')
+REDACTED_VALUE = 'REDACTED'
+# 响应页面中的CSRF token（与 LeafLowTokenCheckin.extract_csrf_token 对应）
+_CSRF_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    rb'(name=["\'](?:_token|csrf_token)["\'][^>]*value=["\'])([^"\']+)(["\'])',
+    rb'(<meta[^>]*name=["\']csrf-token["\'][^>]*content=["\'])([^"\']+)(["\'])',
+)]
+
+def redact_set_cookie(value):
+    """遮盖Set-Cookie的值，保留名称和属性"""
+    pair, sep, attributes = value.partition(';')
+    name, eq, _ = pair.partition('=')
+    return f"{name}{eq}{REDACTED_VALUE}{sep}{attributes}" if eq else value
+
+def is_redacted_cookie(value):
+    return value.split(';', 1)[0].partition('=')[2].strip() == REDACTED_VALUE
+
+def redact_body(body):
+    """遮盖表单请求体中的token字段；不是表单时原样返回"""
+    try:
+        fields = parse_qsl(body.decode('ascii'), keep_blank_values=True, strict_parsing=True)
+    except (UnicodeDecodeError, ValueError):
+        return body
+    if not any(name in REDACTED_FIELDS for name, _ in fields):
+        return body
+    return urlencode([(name, REDACTED_VALUE if name in REDACTED_FIELDS else value) for name, value in fields]).encode('ascii')
+
+def redact_page(content):
+    """遮盖响应页面中的CSRF token"""
+    for pattern in _CSRF_PATTERNS:
+        content = pattern.sub(lambda match: match.group(1) + REDACTED_VALUE.encode() + match.group(3), content)
+    return content
+
+# HTTP/2禁止的逐跳请求头
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade')
+
+HTTP2 = os.getenv('LEAFLOW_HTTP2', '0') == '1'
+SHARED_POOL = os.getenv('LEAFLOW_SHARED_POOL', '1') != '0'
+# 每个站点保持的keep-alive连接数，默认不少于控制面板的签到线程数
+POOL_MAXSIZE = int(os.getenv('LEAFLOW_POOL_MAXSIZE', str(max(DEFAULT_POOLSIZE, int(os.getenv('CHECKIN_WORKERS', '1'))))))
+
+_mode = None
+_archive = None
+_archive_lock = threading.Lock()
+_shared_poolmanager = None
+# 同步的httpx客户端不是线程安全的，每个线程一个
+_http2_local = threading.local()
+
+def shared_poolmanager():
+    """所有会话共用的urllib3连接池"""
+    global _shared_poolmanager
+    with _archive_lock:
+        if _shared_poolmanager is None:
+            _shared_poolmanager = HTTPAdapter(pool_maxsize=POOL_MAXSIZE).poolmanager
+        return _shared_poolmanager
+
+class InstrumentedAdapter(HTTPAdapter):
+    """记录请求次数、延迟和错误的HTTPAdapter"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 本会话的请求统计
+        self.stats = {'http_requests': 0, 'bytes_downloaded': 0, 'last_endpoint': None, 'http_version': None}
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if not SHARED_POOL:
+            return super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = shared_poolmanager()
+
+    def close(self):
+        if self.poolmanager is not _shared_poolmanager:
+            return super().close()
+        # 共用连接池保持打开
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        host, endpoint = url.hostname or '', url.path or '/'
+        self.stats['http_requests'] += 1
+        self.stats['last_endpoint'] = f"{request.method} {host}{endpoint}"
+        start = time.perf_counter()
+        try:
+            response = self.transport_send(request, **kwargs)
+        except requests.exceptions.Timeout:
+            metrics.http_errors.inc(host=host, endpoint=endpoint, kind='timeout')
+            raise
+        except requests.exceptions.ConnectionError:
+            metrics.http_errors.inc(host=host, endpoint=endpoint, kind='connection')
+            raise
+        except Exception:
+            metrics.http_errors.inc(host=host, endpoint=endpoint, kind='other')
+            raise
+        finally:
+            metrics.http_request_seconds.observe(time.perf_counter() - start, host=host)
+        metrics.http_requests.inc(host=host, endpoint=endpoint, status=response.status_code)
+        self.stats['bytes_downloaded'] += len(response.content or b'')
+        return response
+
+    def transport_send(self, request, **kwargs):
+        return super().send(request, **kwargs)
+
+class HttpArchive:
+    """请求/响应归档：每行一个JSON交换记录，gzip压缩"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.exchanges = None
+
+    def append(self, exchange):
+        line = json.dumps(exchange, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.file is None:
+                self.file = gzip.open(self.path, 'at', encoding='utf-8')
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def load(self):
+        """按 (method, url) 分组的响应队列，保持录制顺序"""
+        with self.lock:
+            if self.exchanges is None:
+                exchanges = defaultdict(deque)
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        exchange = json.loads(line)
+                        exchanges[(exchange['method'], exchange['url'])].append(exchange)
+                self.exchanges = exchanges
+            return self.exchanges
+
+    def next_exchange(self, method, url):
+        exchanges = self.load()
+        with self.lock:
+            queue = exchanges.get((method, url))
+            if not queue:
+                return None
+            # 最后一条保留，用于重复回放（基准测试）
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+class RecordingAdapter(InstrumentedAdapter):
+    """真实发送请求并把交换记录写入归档"""
+    def __init__(self, archive, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.archive = archive
+
+    def transport_send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().transport_send(request, **kwargs)
+        content = response.content or b''
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        self.archive.append({
+            'method': request.method,
+            'url': request.url,
+            'request_headers': {k: ('<redacted>' if k.lower() in REDACTED_HEADERS else v) for k, v in request.headers.items()},
+            'request_body': base64.b64encode(redact_body(body)).decode('ascii'),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': [(k, redact_set_cookie(v) if k.lower() == 'set-cookie' else v) for k, v in self._raw_headers(response)],
+            'body': base64.b64encode(redact_page(content)).decode('ascii'),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+        return response
+
+    @staticmethod
+    def _raw_headers(response):
+        # 保留重复的Set-Cookie等响应头
+        raw_headers = getattr(response.raw, 'headers', None)
+        if raw_headers is None:
+            return list(response.headers.items())
+        return list(getattr(raw_headers, 'iteritems', raw_headers.items)())
+
+class _BufferedRaw:
+    """已读完正文的响应的raw对象，让requests照常处理Set-Cookie"""
+    def __init__(self, headers):
+        message = http.client.HTTPMessage()
+        for name, value in headers:
+            message[name] = value
+        self._original_response = type('OriginalResponse', (), {'msg': message})()
+
+    def close(self):
+        pass
+
+class ReplayAdapter(InstrumentedAdapter):
+    """从归档回放响应，不访问网络"""
+    def __init__(self, archive, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.archive = archive
+
+    def transport_send(self, request, **kwargs):
+        exchange = self.archive.next_exchange(request.method, request.url)
+        if exchange is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+
+        # 被遮盖的cookie不写入会话，避免 --save-cookies 把占位符存回配置
+        headers = [(k, v) for k, v in exchange['headers'] if not (k.lower() == 'set-cookie' and is_redacted_cookie(v))]
+        return build_response(self, request, exchange['status'], exchange.get('reason'), headers,
+                              base64.b64decode(exchange['body']), timedelta(milliseconds=exchange.get('elapsed_ms', 0)))
+
+class _RejectCookies(http.cookiejar.DefaultCookiePolicy):
+    """共用的httpx客户端不保存cookie，cookie由各requests会话管理"""
+    def set_ok(self, cookie, request):
+        return False
+
+def http2_client():
+    """当前线程的HTTP/2客户端，线程内的会话共用，每个站点复用一个连接"""
+    client = getattr(_http2_local, 'client', None)
+    if client is None:
+        client = _http2_local.client = httpx.Client(
+            http2=True,
+            follow_redirects=False,
+            cookies=http.cookiejar.CookieJar(policy=_RejectCookies()),
+        )
+    return client
+
+class Http2Adapter(InstrumentedAdapter):
+    """通过当前线程的httpx客户端发送请求 (服务端支持时使用HTTP/2)，连接失败时回退到requests"""
+    def transport_send(self, request, timeout=None, **kwargs):
+        http_timeout = timeout
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+            http_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+        start = time.perf_counter()
+        try:
+            response = http2_client().request(request.method, request.url, headers=headers,
+                                              content=request.body, timeout=http_timeout)
+        except (httpx.ConnectError, httpx.UnsupportedProtocol) as e:
+            logging.debug(f"HTTP/2 client failed for {request.url}, falling back to requests: {e}")
+            self.stats['http_version'] = 'HTTP/1.1'
+            return super().transport_send(request, timeout=timeout, **kwargs)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        self.stats['http_version'] = response.http_version
+        return build_response(self, request, response.status_code, response.reason_phrase,
+                              response.headers.multi_items(), response.content,
+                              timedelta(seconds=time.perf_counter() - start))
+
+def build_response(adapter, request, status, reason, headers, content, elapsed):
+    """用已读完的响应构造requests.Response"""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    # 已解码的正文，去掉编码相关的头
+    headers = [(k, v) for k, v in headers if k.lower() not in ('content-encoding', 'transfer-encoding')]
+    response.headers = CaseInsensitiveDict(headers)
+    response.raw = _BufferedRaw(headers)
+    response._content = content
+    response._content_consumed = True
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    response.elapsed = elapsed
+    return response
+
+def configure(record=None, replay=None, http2=None):
+    """选择传输模式：record=归档路径 录制，replay=归档路径 回放，都为空则直连；http2 切换直连使用的客户端"""
+    global _mode, _archive, HTTP2
+    if http2 is not None:
+        HTTP2 = http2
+    with _archive_lock:
+        if _archive is not None:
+            _archive.close()
+        if record:
+            _mode, _archive = 'record', HttpArchive(record)
+        elif replay:
+            _mode, _archive = 'replay', HttpArchive(replay)
+        else:
+            _mode, _archive = None, None
+
+def warm_up(urls, connections=1, timeout=10):
+    """解析DNS并在共用连接池中为每个站点建立keep-alive连接，返回成功的连接数"""
+    if _mode is not None or not (SHARED_POOL or use_http2()):
+        return 0
+
+    for url in urls:
+        parts = urlsplit(url)
+        try:
+            socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        except OSError:
+            pass
+
+    def open_connection(url):
+        session = requests.Session()
+        session.mount('https://', make_adapter())
+        session.mount('http://', make_adapter())
+        try:
+            session.head(url, timeout=timeout, allow_redirects=False)
+            return True
+        except requests.RequestException:
+            return False
+
+    targets = [url for url in urls for _ in range(max(1, min(connections, POOL_MAXSIZE)))]
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        return sum(executor.map(open_connection, targets))
+
+def use_http2():
+    if HTTP2 and httpx is None:
+        logging.warning("LEAFLOW_HTTP2=1 but httpx is not installed (pip install 'httpx[http2]'), using requests")
+        configure(http2=False)
+    return HTTP2
+
+def make_adapter():
+    """按当前模式创建会话使用的adapter"""
+    with _archive_lock:
+        mode, archive = _mode, _archive
+    if mode == 'record':
+        return RecordingAdapter(archive)
+    if mode == 'replay':
+        return ReplayAdapter(archive)
+    if use_http2():
+        return Http2Adapter()
+    return InstrumentedAdapter()
+
+configure(record=os.getenv('LEAFLOW_HTTP_RECORD'), replay=os.getenv('LEAFLOW_HTTP_REPLAY'))
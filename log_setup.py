@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide logging for LeafLow check-in
+Callers only put records on a queue; a listener thread writes them to a
+rotating log file and the console
+
+Environment:
+    LOG_FORMAT        text (default) or json (one JSON object per line)
+    LOG_MAX_BYTES     rotate the log file at this size (default 10 MB, 0 = never)
+    LOG_BACKUP_COUNT  rotated files to keep (default 5)
+    LOG_ROTATE_WHEN   rotate by time instead, e.g. midnight or H (TimedRotatingFileHandler)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Resolves the message in the caller but leaves formatting (and the traceback) to the listener's formatter"""
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _file_handler(filename):
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(filename, when=LOG_ROTATE_WHEN,
+                                                         backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES,
+                                                backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+def setup_logging(filename, level=logging.INFO):
+    """Route the root logger through a queue to filename and stderr; only the first call configures"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers = [_file_handler(filename), logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
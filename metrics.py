@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process metrics for LeafLow check-in
+Counters, gauges and histograms rendered in the Prometheus text format
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, None, value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, key, extra, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Compute the value at scrape time; function returns a number or {labels tuple: value}"""
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            result = self.function()
+        except Exception:
+            return []
+        if not isinstance(result, dict):
+            result = {(): result}
+        return [(self.name, tuple(str(v) for v in key), None, value) for key, value in result.items()]
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f'{self.name}_bucket', key, ('le', _format_value(bound)), bucket_count))
+                samples.append((f'{self.name}_sum', key, None, total))
+                samples.append((f'{self.name}_count', key, None, count))
+        return samples
+
+def render():
+    """Render every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+# Check-in engine (checkin_token.py)
+http_requests = Counter('leaflow_http_requests_total', 'HTTP requests to LeafLow by host, endpoint and status', ('host', 'endpoint', 'status'))
+http_request_seconds = Histogram('leaflow_http_request_seconds', 'HTTP request latency to LeafLow', ('host',))
+http_errors = Counter('leaflow_http_errors_total', 'HTTP requests to LeafLow that raised, by kind', ('host', 'endpoint', 'kind'))
+auth_probe_seconds = Histogram('leaflow_auth_probe_seconds', 'Authentication probe latency', ('result',))
+checkin_seconds = Histogram('leaflow_checkin_seconds', 'Check-in latency after authentication', ('result',))
+checkin_retries = Counter('leaflow_checkin_retries_total', 'Fallback check-in attempts after the first method failed')
+checkin_deadline_exceeded = Counter('leaflow_checkin_deadline_exceeded_total', 'Account check-ins cut short by their time budget')
+
+# Notifications (notify.py)
+notification_seconds = Histogram('leaflow_notification_seconds', 'Notification delivery latency', ('channel',))
+
+# Control panel (app.py)
+db_query_seconds = Histogram('leaflow_db_query_seconds', 'Database query latency', ('operation',))
+group_commit_size = Histogram('leaflow_group_commit_size', 'Writes committed together by the history writer', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+scheduler_lag_seconds = Gauge('leaflow_scheduler_lag_seconds', 'How late the scheduler is running the most overdue job')
+job_wait_seconds = Histogram('leaflow_job_wait_seconds', 'Time check-in jobs spend queued before a worker claims them')
+job_queue_depth = Gauge('leaflow_job_queue_depth', 'Check-in jobs in the queue by status', ('status',))
+checkin_skipped = Counter('leaflow_checkin_skipped_total', 'Check-ins skipped because the account already succeeded today')
+workers_busy = Gauge('leaflow_workers_busy', 'Check-in worker threads currently running a job')
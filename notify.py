@@ -4,7 +4,11 @@ import json
 import os
 import re
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+import metrics
 
 _print = print
 mutex = threading.Lock()
@@ -30,130 +34,260 @@ for k in push_config:
     if os.getenv(k):
         push_config[k] = os.getenv(k)
 
-def telegram_bot(title: str, content: str) -> None:
+# Shared keep-alive sessions, one per provider
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Shared worker pool for channel fan-out
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '8'))
+_executor = ThreadPoolExecutor(max_workers=NOTIFY_WORKERS, thread_name_prefix='notify')
+
+def get_session(provider: str) -> requests.Session:
     """
-    Send notification via Telegram bot.
+    Get the shared keep-alive session for a provider.
     """
-    print("Telegram bot service starting")
-    
-    token = push_config.get("TG_BOT_TOKEN")
-    chat_id = push_config.get("TG_USER_ID")
-    
-    if not token or not chat_id:
-        print("Telegram configuration missing, please check TG_BOT_TOKEN and TG_USER_ID!")
-        return
-    
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    data = {
-        "chat_id": chat_id,
-        "text": f"{title}\n\n{content}",
-        "disable_web_page_preview": True
-    }
-    
-    try:
-        response = requests.post(url=url, data=data, timeout=30)
-        result = response.json()
-        
-        if result.get("ok"):
-            print("Telegram bot push successful!")
-        else:
-            print(f"Telegram bot push failed! Error: {result.get('description')}")
-    except Exception as e:
-        print(f"Telegram bot push exception: {e}")
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NOTIFY_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
 
-def wecom_bot(title: str, content: str) -> None:
+class HitokotoPool:
     """
-    Send notification via WeChat Work bot.
+    Prefetched pool of Hitokoto sentences with a TTL.
+
+    The first sentence is fetched on demand; the pool is only refilled once a
+    process asks again, so one-shot CLI runs make a single request. Refills run
+    on a daemon thread and never hold up interpreter exit.
+    """
+    url = "https://v1.hitokoto.cn/"
+
+    def __init__(self, size: int = 10, ttl: int = 3600):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sentences = []
+        self.fetched_at = 0
+        self.refilling = False
+        self.requests = 0
+
+    def fetch(self) -> str:
+        res = get_session("hitokoto").get(self.url, timeout=10).json()
+        return res["hitokoto"] + "    ----" + res["from"]
+
+    def refill(self) -> None:
+        sentences = []
+        for _ in range(self.size):
+            try:
+                sentences.append(self.fetch())
+            except Exception as e:
+                print(f"Hitokoto fetch failed: {e}")
+                break
+        with self.lock:
+            if sentences:
+                self.sentences = sentences
+                self.fetched_at = time.time()
+            self.refilling = False
+
+    def prefetch(self) -> None:
+        """Refill the pool in the background if it is stale or running low."""
+        with self.lock:
+            stale = time.time() - self.fetched_at > self.ttl
+            if self.refilling or (not stale and len(self.sentences) > self.size // 2):
+                return
+            self.refilling = True
+        threading.Thread(target=self.refill, name='hitokoto-refill', daemon=True).start()
+
+    def get(self) -> str:
+        with self.lock:
+            self.requests += 1
+            repeated = self.requests > 1
+            fresh = time.time() - self.fetched_at <= self.ttl
+            sentence = self.sentences.pop() if fresh and self.sentences else None
+        if repeated:
+            self.prefetch()
+        if sentence:
+            return sentence
+        try:
+            return self.fetch()
+        except Exception as e:
+            print(f"Hitokoto fetch failed: {e}")
+            return "Hitokoto fetch failed"
+
+hitokoto_pool = HitokotoPool()
+
+class Notifier:
+    """
+    Notification sender bound to its own configuration.
+
+    Instances never touch the global push_config, so several notifiers
+    can send concurrently from different threads.
     """
-    print("WeChat Work bot service starting")
-    
-    key = push_config.get("QYWX_KEY")
-    if not key:
-        print("WeChat Work configuration missing, please check QYWX_KEY!")
-        return
-    
-    url = f"https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key={key}"
-    headers = {"Content-Type": "application/json;charset=utf-8"}
-    data = {"msgtype": "text", "text": {"content": f"{title}\n\n{content}"}}
-    
-    try:
-        response = requests.post(
-            url=url, data=json.dumps(data), headers=headers, timeout=15
-        ).json()
-
-        if response.get("errcode") == 0:
-            print("WeChat Work bot push successful!")
-        else:
-            print(f"WeChat Work bot push failed! Error code: {response.get('errcode')}, Error message: {response.get('errmsg')}")
-    except Exception as e:
-        print(f"WeChat Work bot push exception: {e}")
+
+    def __init__(self, config: dict = None):
+        self.config = dict(push_config if config is None else config)
+
+    def telegram_bot(self, title: str, content: str) -> None:
+        """
+        Send notification via Telegram bot.
+        """
+        print("Telegram bot service starting")
+
+        token = self.config.get("TG_BOT_TOKEN")
+        chat_id = self.config.get("TG_USER_ID")
+
+        if not token or not chat_id:
+            print("Telegram configuration missing, please check TG_BOT_TOKEN and TG_USER_ID!")
+            return
+
+        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        data = {
+            "chat_id": chat_id,
+            "text": f"{title}\n\n{content}",
+            "disable_web_page_preview": True
+        }
+
+        try:
+            response = get_session("telegram").post(url=url, data=data, timeout=30)
+            result = response.json()
+
+            if result.get("ok"):
+                print("Telegram bot push successful!")
+            else:
+                print(f"Telegram bot push failed! Error: {result.get('description')}")
+        except Exception as e:
+            print(f"Telegram bot push exception: {e}")
+
+    def wecom_bot(self, title: str, content: str) -> None:
+        """
+        Send notification via WeChat Work bot.
+        """
+        print("WeChat Work bot service starting")
+
+        key = self.config.get("QYWX_KEY")
+        if not key:
+            print("WeChat Work configuration missing, please check QYWX_KEY!")
+            return
+
+        url = f"https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key={key}"
+        headers = {"Content-Type": "application/json;charset=utf-8"}
+        data = {"msgtype": "text", "text": {"content": f"{title}\n\n{content}"}}
+
+        try:
+            response = get_session("wecom").post(
+                url=url, data=json.dumps(data), headers=headers, timeout=15
+            ).json()
+
+            if response.get("errcode") == 0:
+                print("WeChat Work bot push successful!")
+            else:
+                print(f"WeChat Work bot push failed! Error code: {response.get('errcode')}, Error message: {response.get('errmsg')}")
+        except Exception as e:
+            print(f"WeChat Work bot push exception: {e}")
+
+    def console(self, title: str, content: str) -> None:
+        """
+        Print notification to console.
+        """
+        print(f"{title}\n\n{content}")
+
+    def notify_functions(self):
+        """Collect the notification functions enabled by this config"""
+        notify_function = []
+
+        if self.config.get("CONSOLE"):
+            notify_function.append(self.console)
+
+        if self.config.get("QYWX_KEY"):
+            notify_function.append(self.wecom_bot)
+
+        if self.config.get("TG_BOT_TOKEN") and self.config.get("TG_USER_ID"):
+            notify_function.append(self.telegram_bot)
+
+        return notify_function
+
+    def submit(self, title: str, content: str) -> list:
+        """
+        Start sending a notification and return the pending futures.
+        """
+        if not content:
+            print(f"{title} Push content is empty!")
+            return []
+
+        # Skip push based on title, environment variable: SKIP_PUSH_TITLE separated by newline
+        skipTitle = os.getenv("SKIP_PUSH_TITLE")
+        if skipTitle:
+            if title in re.split("\n", skipTitle):
+                print(f"{title} is in SKIP_PUSH_TITLE environment variable, skipping push!")
+                return []
+
+        # Add Hitokoto
+        hitokoto = self.config.get("HITOKOTO")
+        if hitokoto and hitokoto != "false":
+            content += "\n\n" + hitokoto_pool.get()
+
+        return [_executor.submit(self._timed, mode, title, content) for mode in self.notify_functions()]
+
+    def _timed(self, mode, title: str, content: str) -> None:
+        with metrics.notification_seconds.time(channel=mode.__name__):
+            mode(title, content)
+
+    def send(self, title: str, content: str) -> None:
+        for future in self.submit(title, content):
+            future.result()
+
+    def send_many(self, messages) -> None:
+        """
+        Send several (title, content) notifications concurrently.
+        """
+        futures = []
+        for title, content in messages:
+            futures.extend(self.submit(title, content))
+        for future in futures:
+            future.result()
 
 def one() -> str:
     """
     Get a random sentence from Hitokoto API.
     """
-    url = "https://v1.hitokoto.cn/"
-    try:
-        res = requests.get(url, timeout=10).json()
-        return res["hitokoto"] + "    ----" + res["from"]
-    except Exception as e:
-        print(f"Hitokoto fetch failed: {e}")
-        return "Hitokoto fetch failed"
+    return hitokoto_pool.get()
+
+# Module-level channel functions using the global push_config, kept for existing callers
+
+def telegram_bot(title: str, content: str) -> None:
+    """
+    Send notification via Telegram bot.
+    """
+    Notifier().telegram_bot(title, content)
+
+def wecom_bot(title: str, content: str) -> None:
+    """
+    Send notification via WeChat Work bot.
+    """
+    Notifier().wecom_bot(title, content)
 
 def console(title: str, content: str) -> None:
     """
     Print notification to console.
     """
-    print(f"{title}\n\n{content}")
+    Notifier().console(title, content)
 
 def add_notify_function():
     """Add all notification functions"""
-    notify_function = []
-    
-    if push_config.get("CONSOLE"):
-        notify_function.append(console)
-    
-    if push_config.get("QYWX_KEY"):
-        notify_function.append(wecom_bot)
-    
-    if push_config.get("TG_BOT_TOKEN") and push_config.get("TG_USER_ID"):
-        notify_function.append(telegram_bot)
-
-    return notify_function
+    return Notifier().notify_functions()
 
 def send(title: str, content: str, ignore_default_config: bool = False, **kwargs):
-    if kwargs:
-        global push_config
-        if ignore_default_config:
-            push_config = kwargs
-        else:
-            push_config.update(kwargs)
-
-    if not content:
-        print(f"{title} Push content is empty!")
-        return
-
-    # Skip push based on title, environment variable: SKIP_PUSH_TITLE separated by newline
-    skipTitle = os.getenv("SKIP_PUSH_TITLE")
-    if skipTitle:
-        if title in re.split("\n", skipTitle):
-            print(f"{title} is in SKIP_PUSH_TITLE environment variable, skipping push!")
-            return
+    # Defaults are only ignored when overrides are passed
+    if ignore_default_config and kwargs:
+        config = kwargs
+    else:
+        config = {**push_config, **kwargs}
 
-    # Add Hitokoto
-    hitokoto = push_config.get("HITOKOTO")
-    if hitokoto and hitokoto != "false":
-        content += "\n\n" + one()
-
-    # Execute notification functions
-    notify_function = add_notify_function()
-    
-    ts = [
-        threading.Thread(target=mode, args=(title, content), name=mode.__name__)
-        for mode in notify_function
-    ]
-    [t.start() for t in ts]
-    [t.join() for t in ts]
+    Notifier(config).send(title, content)
 
 def main():
     print("Starting test notification...")
@@ -161,4 +295,4 @@ def main():
     print("Notification request completed")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()